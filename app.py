@@ -1,55 +1,523 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import (Flask, Response, render_template, request, redirect, url_for, flash, jsonify, g, session,
+                   send_from_directory, stream_with_context)
+from flask.json.provider import DefaultJSONProvider
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import generate_password_hash, check_password_hash, safe_join
 import sqlite3
 import os
+import base64
+import binascii
+import gzip
+import hashlib
+import itertools
+import json
+import mimetypes
+import queue
+import threading
+import time
+import zlib
+import logging
+import click
+from collections import OrderedDict
+from concurrent.futures import Future
 from functools import wraps
 
-def get_db_connection(db_path):
+try:
+    import brotli
+except ImportError:  # Optional; responses fall back to gzip
+    brotli = None
+
+try:
+    import orjson
+except ImportError:  # Optional; JSON falls back to the stdlib encoder
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Connection tuning profiles selectable with the DATABASE_PRAGMAS setting.
+# journal_mode is stored in the database file itself, so it is applied once
+# when the database is initialized; the rest is applied to every connection.
+DATABASE_PRAGMA_PROFILES = {
+    # WAL with full fsync on commit: readers never wait for the writer
+    'durable': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'busy_timeout': 5000,
+        'cache_size': -16000,  # negative values are KiB, so ~16 MB
+        'mmap_size': 64 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    },
+    # WAL fsyncs only at checkpoints; a power loss may drop the last commits
+    'fast': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -32000,
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    },
+    # Large page cache and mapping for databases that are mostly read
+    'read-heavy': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 10000,
+        'cache_size': -64000,
+        'mmap_size': 1024 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    },
+}
+
+DEFAULT_PRAGMA_PROFILE = 'durable'
+
+def resolve_database_pragmas(setting=None):
+    """Turn a DATABASE_PRAGMAS setting (profile name or dict) into a dict of pragmas"""
+    if setting is None:
+        setting = DEFAULT_PRAGMA_PROFILE
+    if isinstance(setting, str):
+        if setting not in DATABASE_PRAGMA_PROFILES:
+            raise ValueError(
+                f"Unknown DATABASE_PRAGMAS profile {setting!r}; expected one of "
+                f"{', '.join(sorted(DATABASE_PRAGMA_PROFILES))}"
+            )
+        return dict(DATABASE_PRAGMA_PROFILES[setting])
+    return dict(setting)
+
+def apply_connection_pragmas(db, pragmas):
+    """Apply the per-connection pragmas (everything except journal_mode)"""
+    for name, value in pragmas.items():
+        if name == 'journal_mode':
+            continue
+        db.execute(f'PRAGMA {name} = {value}')
+
+def persist_journal_mode(db_path, pragmas=None):
+    """Store the profile's journal mode in the database file"""
+    pragmas = resolve_database_pragmas(pragmas)
+    journal_mode = pragmas.get('journal_mode')
+    if not journal_mode:
+        return None
+    db = sqlite3.connect(db_path)
+    try:
+        return db.execute(f'PRAGMA journal_mode = {journal_mode}').fetchone()[0]
+    finally:
+        db.close()
+
+def get_db_connection(db_path, pragmas=None):
     """Get database connection for a given database path"""
     db = sqlite3.connect(db_path)
     db.row_factory = sqlite3.Row
+    apply_connection_pragmas(db, resolve_database_pragmas(pragmas))
     return db
 
+class ConnectionPool:
+    """Bounded per-thread pool of warmed SQLite connections for one database.
+
+    SQLite connections may only be used from the thread that created them, so
+    each worker thread keeps its own small stack of idle connections. A
+    request acquires one, and the app-context teardown hands it back.
+    """
+
+    def __init__(self, db_path, max_idle=4, pragmas=None):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self.pragmas = resolve_database_pragmas(pragmas)
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _idle(self):
+        idle = getattr(self._local, 'idle', None)
+        if idle is None:
+            idle = self._local.idle = []
+        return idle
+
+    def acquire(self):
+        """Return an idle connection for this thread, or open a new one"""
+        idle = self._idle()
+        if idle:
+            with self._lock:
+                self.hits += 1
+            return idle.pop()
+        with self._lock:
+            self.misses += 1
+        return get_db_connection(self.db_path, self.pragmas)
+
+    def release(self, db):
+        """Return a connection to this thread's pool, closing it if the pool is full"""
+        try:
+            if db.in_transaction:
+                db.rollback()
+        except sqlite3.Error:
+            db.close()
+            return
+        idle = self._idle()
+        if len(idle) < self.max_idle:
+            idle.append(db)
+        else:
+            db.close()
+
+    def close_idle(self):
+        """Close the idle connections held by the calling thread"""
+        idle = self._idle()
+        while idle:
+            idle.pop().close()
+
+    def stats(self):
+        """Return pool hit/miss counters"""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 4) if total else 0.0,
+        }
+
+class LRUCache:
+    """Thread-safe least-recently-used cache with an optional time-to-live.
+
+    Entries older than ttl seconds are treated as missing. When max_bytes is
+    set, sizeof(value) weighs each entry and the least recently used entries
+    are evicted until the total fits. Hit and miss counters are kept for
+    reporting.
+    """
+
+    def __init__(self, max_entries=1024, ttl=None, clock=time.monotonic,
+                 max_bytes=None, sizeof=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._sizeof = sizeof
+        self._bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at, size = entry
+                if expires_at is None or expires_at > self._clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        """Store value under key, evicting the least recently used entries"""
+        if self.max_entries <= 0:
+            return
+        expires_at = self._clock() + self.ttl if self.ttl else None
+        size = self._sizeof(value) if self._sizeof else 0
+        with self._lock:
+            self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or (
+                    self.max_bytes is not None and self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def invalidate(self, key):
+        """Drop the entry for key if present"""
+        with self._lock:
+            self._remove(key)
+
+    def invalidate_matching(self, predicate):
+        """Drop every entry whose key satisfies predicate"""
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                self._remove(key)
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Return size and hit/miss counters"""
+        with self._lock:
+            hits, misses, size, used = self.hits, self.misses, len(self._entries), self._bytes
+        total = hits + misses
+        stats = {
+            'entries': size,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 4) if total else 0.0,
+        }
+        if self.max_bytes is not None:
+            stats['bytes'] = used
+        return stats
+
+class CachedChecklist:
+    """Item tree of one checklist version plus serialized renderings of it"""
+
+    # Rough in-memory cost of one item dict in the built tree
+    ITEM_OVERHEAD = 512
+
+    def __init__(self, tree, item_count):
+        self.tree = tree
+        self.item_count = item_count
+        self.renderings = {}
+
+    def sizeof(self):
+        """Approximate memory held by this entry, in bytes"""
+        rendered = sum(len(body) for body in self.renderings.values())
+        return self.item_count * self.ITEM_OVERHEAD + rendered
+
+class StoredResponse:
+    """Response recorded for an idempotency key, replayed on retries"""
+
+    # Rough in-memory cost of the key, headers and bookkeeping
+    OVERHEAD = 256
+
+    def __init__(self, fingerprint, status, body, headers):
+        self.fingerprint = fingerprint
+        self.status = status
+        self.body = body
+        self.headers = headers
+
+    def sizeof(self):
+        """Approximate memory held by this entry, in bytes"""
+        return len(self.body) + self.OVERHEAD
+
+class IdempotencyInProgress(Exception):
+    """Another request with the same idempotency key did not finish in time"""
+
+class IdempotencyStore:
+    """Completed responses by idempotency key plus the requests still running.
+
+    Finished responses live in an LRUCache bounded by ttl, entry count and
+    bytes. The first request for a key claims it; duplicates arriving while
+    it runs wait for it to finish and then replay its response. If the owner
+    records nothing (a server error), the next waiter runs the request itself.
+    """
+
+    def __init__(self, max_entries=10000, ttl=24 * 3600, max_bytes=None, clock=time.monotonic):
+        self.responses = LRUCache(max_entries, ttl, clock=clock, max_bytes=max_bytes,
+                                  sizeof=StoredResponse.sizeof)
+        self.replayed = 0
+        self.waited = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key, timeout):
+        """Return the stored response for key, or None once the caller owns key.
+
+        Raises IdempotencyInProgress if another request holds key for longer
+        than timeout seconds.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                stored = self.responses.get(key)
+                if stored is not None:
+                    self.replayed += 1
+                    return stored
+                done = self._pending.get(key)
+                if done is None:
+                    self._pending[key] = threading.Event()
+                    return None
+                self.waited += 1
+            if not done.wait(max(deadline - time.monotonic(), 0)):
+                raise IdempotencyInProgress(key)
+
+    def release(self, key, stored=None):
+        """Record the response for an owned key, if any, and wake the waiters"""
+        with self._lock:
+            if stored is not None:
+                self.responses.set(key, stored)
+            done = self._pending.pop(key, None)
+        if done is not None:
+            done.set()
+
+    def stats(self):
+        """Return cache counters plus replay and in-flight figures"""
+        stats = self.responses.stats()
+        with self._lock:
+            stats.update(replayed=self.replayed, waited=self.waited, in_flight=len(self._pending))
+        return stats
+
+def add_missing_item_columns(db):
+    """Add the items columns that databases from before subitems and links lack"""
+    existing = {row['name'] for row in db.execute('PRAGMA table_info(items)')}
+    if 'parent_item_id' not in existing:
+        db.execute('ALTER TABLE items ADD COLUMN parent_item_id INTEGER REFERENCES items (id)')
+    if 'url' not in existing:
+        db.execute('ALTER TABLE items ADD COLUMN url TEXT')
+
+# Ordered, in-place schema migrations applied on top of schema.sql.
+# PRAGMA user_version records the last migration a database has received;
+# append new entries with the next version number and never edit old ones.
+# A step is either an SQL statement or a callable taking the connection.
+MIGRATIONS = [
+    (1, 'Index the checklist, parent and owner lookups', [
+        # Databases older than subitems and links must gain those columns first
+        add_missing_item_columns,
+        'CREATE INDEX IF NOT EXISTS idx_items_checklist ON items (checklist_id, id)',
+        'CREATE INDEX IF NOT EXISTS idx_items_parent ON items (parent_item_id, id)',
+        'CREATE INDEX IF NOT EXISTS idx_checklists_user ON checklists (user_id, id, title)',
+        'ANALYZE',
+    ]),
+    (2, 'Version counter bumped by every checklist or item change', [
+        'ALTER TABLE checklists ADD COLUMN version INTEGER NOT NULL DEFAULT 1',
+    ]),
+    (3, 'Item counters kept exact by triggers on every items write', [
+        'ALTER TABLE checklists ADD COLUMN total_items INTEGER NOT NULL DEFAULT 0',
+        'ALTER TABLE checklists ADD COLUMN checked_items INTEGER NOT NULL DEFAULT 0',
+        # Triggers fire per row, so subtree deletes and batches stay exact too
+        '''CREATE TRIGGER IF NOT EXISTS items_count_insert AFTER INSERT ON items BEGIN
+            UPDATE checklists SET total_items = total_items + 1,
+                                  checked_items = checked_items + (NEW.checked != 0)
+            WHERE id = NEW.checklist_id;
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS items_count_delete AFTER DELETE ON items BEGIN
+            UPDATE checklists SET total_items = total_items - 1,
+                                  checked_items = checked_items - (OLD.checked != 0)
+            WHERE id = OLD.checklist_id;
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS items_count_update AFTER UPDATE OF checked, checklist_id ON items BEGIN
+            UPDATE checklists SET total_items = total_items - 1,
+                                  checked_items = checked_items - (OLD.checked != 0)
+            WHERE id = OLD.checklist_id;
+            UPDATE checklists SET total_items = total_items + 1,
+                                  checked_items = checked_items + (NEW.checked != 0)
+            WHERE id = NEW.checklist_id;
+        END''',
+        'UPDATE checklists SET '
+        'total_items = (SELECT COUNT(*) FROM items WHERE items.checklist_id = checklists.id), '
+        'checked_items = (SELECT COUNT(*) FROM items WHERE items.checklist_id = checklists.id AND checked != 0)',
+    ]),
+    (4, 'Change log for delta sync, appended by triggers on every write', [
+        '''CREATE TABLE IF NOT EXISTS changes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            checklist_id INTEGER NOT NULL,
+            entity TEXT NOT NULL,
+            entity_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            created_at INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_changes_user ON changes (user_id, id)',
+        'CREATE INDEX IF NOT EXISTS idx_changes_entity ON changes (entity, entity_id, id)',
+        # Highest change id removed by compaction; older cursors must resync
+        '''CREATE TABLE IF NOT EXISTS changes_compacted (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            through_id INTEGER NOT NULL
+        )''',
+        'INSERT OR IGNORE INTO changes_compacted (id, through_id) VALUES (1, 0)',
+        '''CREATE TRIGGER IF NOT EXISTS changes_item_insert AFTER INSERT ON items BEGIN
+            INSERT INTO changes (user_id, checklist_id, entity, entity_id, op)
+            SELECT user_id, id, 'item', NEW.id, 'upsert' FROM checklists WHERE id = NEW.checklist_id;
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS changes_item_update AFTER UPDATE ON items BEGIN
+            INSERT INTO changes (user_id, checklist_id, entity, entity_id, op)
+            SELECT user_id, id, 'item', NEW.id, 'upsert' FROM checklists WHERE id = NEW.checklist_id;
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS changes_item_delete AFTER DELETE ON items BEGIN
+            INSERT INTO changes (user_id, checklist_id, entity, entity_id, op)
+            SELECT user_id, id, 'item', OLD.id, 'delete' FROM checklists WHERE id = OLD.checklist_id;
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS changes_checklist_insert AFTER INSERT ON checklists BEGIN
+            INSERT INTO changes (user_id, checklist_id, entity, entity_id, op)
+            VALUES (NEW.user_id, NEW.id, 'checklist', NEW.id, 'upsert');
+        END''',
+        # Only the title is client data; counters and versions follow item changes
+        '''CREATE TRIGGER IF NOT EXISTS changes_checklist_update AFTER UPDATE OF title ON checklists BEGIN
+            INSERT INTO changes (user_id, checklist_id, entity, entity_id, op)
+            VALUES (NEW.user_id, NEW.id, 'checklist', NEW.id, 'upsert');
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS changes_checklist_delete AFTER DELETE ON checklists BEGIN
+            INSERT INTO changes (user_id, checklist_id, entity, entity_id, op)
+            VALUES (OLD.user_id, OLD.id, 'checklist', OLD.id, 'delete');
+        END''',
+    ]),
+    (5, 'Per-item version counter for conditional writes', [
+        'ALTER TABLE items ADD COLUMN version INTEGER NOT NULL DEFAULT 1',
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(db):
+    """Return the migration version recorded in the database"""
+    return db.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate_db(db):
+    """Apply pending migrations in order, each in its own transaction.
+
+    Returns the list of versions that were applied.
+    """
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        if get_schema_version(db) >= version:
+            continue
+        # Take the write lock first so concurrent processes migrate once
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            if get_schema_version(db) < version:
+                for statement in statements:
+                    if callable(statement):
+                        statement(db)
+                    else:
+                        db.execute(statement)
+                db.execute(f'PRAGMA user_version = {int(version)}')
+                applied.append(version)
+            db.commit()
+        except sqlite3.Error:
+            db.rollback()
+            raise
+    return applied
+
+def recompute_checklist_counters(db, checklist_id=None):
+    """Recount total_items and checked_items from the items table.
+
+    Repairs the counters of one checklist, or of all when checklist_id is
+    None. Returns the number of checklists whose counters were wrong.
+    """
+    where, params = ('WHERE id = ?', (checklist_id,)) if checklist_id is not None else ('', ())
+    counts = '''
+        SELECT id,
+               (SELECT COUNT(*) FROM items WHERE items.checklist_id = checklists.id) AS total,
+               (SELECT COUNT(*) FROM items WHERE items.checklist_id = checklists.id AND checked != 0) AS done
+        FROM checklists
+    '''
+    stale = db.execute(f'''
+        SELECT id, total, done FROM ({counts} {where}) AS counts
+        JOIN checklists USING (id)
+        WHERE total != total_items OR done != checked_items
+    ''', params).fetchall()
+    db.executemany('UPDATE checklists SET total_items = ?, checked_items = ? WHERE id = ?',
+                   [(row['total'], row['done'], row['id']) for row in stale])
+    return len(stale)
+
 def database_exists_and_initialized(db_path):
-    """Check if database exists and has the required tables"""
+    """Check if database exists, has the required tables and is fully migrated"""
     if not os.path.exists(db_path):
         return False
     
     try:
         db = get_db_connection(db_path)
-        # Check if all required tables exist
-        required_tables = ['users', 'checklists', 'items']
-        for table in required_tables:
-            result = db.execute(
-                "SELECT name FROM sqlite_master WHERE type='table' AND name=?",
-                (table,)
-            ).fetchone()
-            if not result:
-                return False
-        
-        # Check if tables have the expected structure
-        # Check users table
-        users_schema = db.execute("PRAGMA table_info(users)").fetchall()
-        if len(users_schema) < 3:  # Should have id, username, password columns
-            return False
-        
-        # Check checklists table  
-        checklists_schema = db.execute("PRAGMA table_info(checklists)").fetchall()
-        if len(checklists_schema) < 3:  # Should have id, user_id, title columns
-            return False
-        
-        # Check items table
-        items_schema = db.execute("PRAGMA table_info(items)").fetchall()
-        if len(items_schema) < 4:  # Should have at least id, checklist_id, content, checked columns
+        table_count = db.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type='table' AND name IN ('users', 'checklists', 'items')"
+        ).fetchone()[0]
+        if table_count < 3:
             return False
         
-        # Check if new columns exist (for schema updates)
-        column_names = [col[1] for col in items_schema]
-        if 'parent_item_id' not in column_names or 'url' not in column_names:
-            return False
-        
-        return True
+        return get_schema_version(db) >= SCHEMA_VERSION
         
     except sqlite3.Error:
         return False
@@ -59,14 +527,17 @@ def database_exists_and_initialized(db_path):
 
 def init_db(app_instance=None, db_path=None):
     """Initialize database only if it doesn't exist or is not properly set up"""
+    pragmas = None
     if app_instance:
         db_path = app_instance.config['DATABASE']
+        pragmas = app_instance.config.get('DATABASE_PRAGMAS')
     
     if not db_path:
         raise ValueError("Either app_instance or db_path must be provided")
     
     if database_exists_and_initialized(db_path):
         print("Database already exists and is properly initialized.")
+        persist_journal_mode(db_path, pragmas)
         return
         
     print("Initializing database...")
@@ -77,64 +548,1401 @@ def init_db(app_instance=None, db_path=None):
     if app_instance:
         # Use Flask app context for schema loading
         with app_instance.app_context():
-            db = get_db_connection(db_path)
+            db = get_db_connection(db_path, pragmas)
             with app_instance.open_resource('schema.sql', mode='r') as f:
                 db.cursor().executescript(f.read())
             db.commit()
+            applied = migrate_db(db)
             db.close()
     else:
         # Direct schema loading for standalone use
         schema_path = os.path.join(os.path.dirname(__file__), 'schema.sql')
-        db = get_db_connection(db_path)
+        db = get_db_connection(db_path, pragmas)
         with open(schema_path, 'r') as f:
             db.cursor().executescript(f.read())
         db.commit()
+        applied = migrate_db(db)
         db.close()
     
+    persist_journal_mode(db_path, pragmas)
+    if applied:
+        print(f"Applied migrations: {', '.join(str(version) for version in applied)}")
     print("Database initialized successfully.")
 
+# Database files already verified by ensure_db_initialized in this process.
+# Entries are keyed on file identity, so a replaced file is checked again.
+_verified_databases = set()
+_verified_databases_lock = threading.Lock()
+
+def _database_identity(db_path):
+    try:
+        st = os.stat(db_path)
+    except OSError:
+        return None
+    return (os.path.realpath(db_path), st.st_dev, st.st_ino)
+
 def ensure_db_initialized(app_instance=None, db_path=None):
-    """Ensure database is initialized - safe to call multiple times"""
+    """Ensure database is initialized - safe to call multiple times.
+
+    The schema check runs once per database file per process; later calls
+    return immediately.
+    """
     if app_instance:
         db_path = app_instance.config['DATABASE']
     
-    if not database_exists_and_initialized(db_path):
-        init_db(app_instance, db_path)
+    if _database_identity(db_path) in _verified_databases:
+        return
+    
+    with _verified_databases_lock:
+        if _database_identity(db_path) in _verified_databases:
+            return
+        if not database_exists_and_initialized(db_path):
+            init_db(app_instance, db_path)
+        else:
+            pragmas = app_instance.config.get('DATABASE_PRAGMAS') if app_instance else None
+            persist_journal_mode(db_path, pragmas)
+        _verified_databases.add(_database_identity(db_path))
 
-def organize_items_hierarchically(all_items):
-    """Organize items into a hierarchical structure"""
-    items_dict = {}
-    root_items = []
+def normalize_url(url):
+    """Prefix a scheme-less URL with https://"""
+    if url and not (url.startswith('http://') or url.startswith('https://')):
+        url = 'https://' + url
+    return url
+
+class BatchError(ValueError):
+    """Raised when an entry of an item batch is invalid"""
+
+    def __init__(self, message, index):
+        super().__init__(message)
+        self.index = index
+
+# Largest value SQLite can bind as an INTEGER; larger ints raise OverflowError
+SQLITE_MAX_INTEGER = 2 ** 63 - 1
+
+def fits_sqlite_integer(value):
+    """Whether an int can be bound as an SQLite INTEGER"""
+    return -SQLITE_MAX_INTEGER - 1 <= value <= SQLITE_MAX_INTEGER
+
+def is_temp_id(value):
+    """Whether value can serve as a batch temp_id (a string or integer)"""
+    return isinstance(value, (str, int)) and not isinstance(value, bool)
+
+def flatten_item_batch(entries):
+    """Validate a batch of new items and flatten nested subitems.
+
+    Entries may nest children under 'subitems', or reference an earlier entry
+    with 'parent_temp_id' (matching its 'temp_id') or an existing item with
+    'parent_item_id'. Returns a list of row dicts in creation order, where
+    'parent_index' points at an earlier row and 'temp_id' is a string, as
+    JSON object keys are (1 and "1" name the same entry). Raises BatchError
+    on bad input.
+    """
+    if not isinstance(entries, list):
+        raise BatchError('Items must be a list', None)
     
-    # First pass: create dictionary of all items
-    for item in all_items:
-        item_dict = dict(item)
-        item_dict['subitems'] = []
-        items_dict[item['id']] = item_dict
-    
-    # Second pass: organize hierarchy
-    for item in all_items:
-        if item['parent_item_id'] is None:
-            # Root item
-            root_items.append(items_dict[item['id']])
+    rows = []
+    temp_ids = {}
+    # Iterative pre-order walk so deeply nested input cannot exhaust the stack
+    stack = [(entry, None) for entry in reversed(entries)]
+    while stack:
+        entry, parent_index = stack.pop()
+        index = len(rows)
+        if not isinstance(entry, dict):
+            raise BatchError('Each item must be an object', index)
+        
+        content = entry.get('content')
+        if not isinstance(content, str):
+            raise BatchError('Content is required', index)
+        content = content.strip()
+        if not content:
+            raise BatchError('Content cannot be empty', index)
+        
+        url = entry.get('url') or ''
+        if not isinstance(url, str):
+            raise BatchError('Invalid url', index)
+        
+        parent_item_id = None
+        if parent_index is None and entry.get('parent_temp_id') is not None:
+            if not is_temp_id(entry['parent_temp_id']):
+                raise BatchError('Invalid parent_temp_id', index)
+            parent_index = temp_ids.get(str(entry['parent_temp_id']))
+            if parent_index is None:
+                raise BatchError('Unknown parent_temp_id', index)
+        elif parent_index is None and entry.get('parent_item_id') is not None:
+            try:
+                parent_item_id = int(entry['parent_item_id'])
+            except (ValueError, TypeError):
+                raise BatchError('Invalid parent_item_id', index)
+            if not fits_sqlite_integer(parent_item_id):
+                raise BatchError('Invalid parent_item_id', index)
+        
+        temp_id = entry.get('temp_id')
+        if temp_id is not None:
+            if not is_temp_id(temp_id):
+                raise BatchError('Invalid temp_id', index)
+            temp_id = str(temp_id)
+            if temp_id in temp_ids:
+                raise BatchError('Duplicate temp_id', index)
+            temp_ids[temp_id] = index
+        
+        rows.append({
+            'content': content,
+            'url': normalize_url(url.strip()),
+            'checked': 1 if entry.get('checked') else 0,
+            'parent_index': parent_index,
+            'parent_item_id': parent_item_id,
+            'temp_id': temp_id,
+        })
+        
+        subitems = entry.get('subitems') or []
+        if not isinstance(subitems, list):
+            raise BatchError('Subitems must be a list', index)
+        stack.extend((child, index) for child in reversed(subitems))
+    
+    return rows
+
+ITEM_OPERATIONS = ('toggle', 'set_checked', 'update', 'delete')
+
+def validate_item_operations(operations):
+    """Validate a list of item operations for a batch mutation.
+
+    Returns normalized operation dicts; raises BatchError on bad input.
+    """
+    if not isinstance(operations, list):
+        raise BatchError('Operations must be a list', None)
+    
+    normalized = []
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict):
+            raise BatchError('Each operation must be an object', index)
+        op = operation.get('op')
+        if op not in ITEM_OPERATIONS:
+            raise BatchError(f"Unknown op; expected one of {', '.join(ITEM_OPERATIONS)}", index)
+        try:
+            item_id = int(operation.get('id'))
+        except (ValueError, TypeError):
+            raise BatchError('Invalid id', index)
+        if not fits_sqlite_integer(item_id):
+            raise BatchError('Invalid id', index)
+        
+        entry = {'op': op, 'id': item_id}
+        if operation.get('version') is not None:
+            version = operation['version']
+            if isinstance(version, bool) or not isinstance(version, int) or not fits_sqlite_integer(version):
+                raise BatchError('Invalid version', index)
+            entry['version'] = version
+        if op == 'set_checked':
+            if 'checked' not in operation:
+                raise BatchError('checked is required', index)
+            entry['checked'] = 1 if operation['checked'] else 0
+        elif op == 'update':
+            if 'content' in operation:
+                content = operation['content']
+                if not isinstance(content, str) or not content.strip():
+                    raise BatchError('Content cannot be empty', index)
+                entry['content'] = content.strip()
+            if 'url' in operation:
+                url = operation['url'] or ''
+                if not isinstance(url, str):
+                    raise BatchError('Invalid url', index)
+                entry['url'] = normalize_url(url.strip())
+            if 'content' not in entry and 'url' not in entry:
+                raise BatchError('No valid fields to update', index)
+        normalized.append(entry)
+    return normalized
+
+def insert_item_batch(db, checklist_id, rows):
+    """Insert flattened batch rows with one executemany and return their ids.
+
+    Must run inside a write transaction (BEGIN IMMEDIATE): ids are allocated
+    up front from the AUTOINCREMENT sequence so children can reference
+    parents created in the same statement.
+    """
+    last_id = db.execute("""
+        SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'items'), 0),
+                   COALESCE((SELECT MAX(id) FROM items), 0))
+    """).fetchone()[0]
+    ids = [last_id + offset for offset in range(1, len(rows) + 1)]
+    
+    params = []
+    for item_id, row in zip(ids, rows):
+        if row['parent_index'] is not None:
+            parent_item_id = ids[row['parent_index']]
         else:
-            # Subitem - add to parent's subitems list
-            if item['parent_item_id'] in items_dict:
-                items_dict[item['parent_item_id']]['subitems'].append(items_dict[item['id']])
+            parent_item_id = row['parent_item_id']
+        params.append((item_id, checklist_id, parent_item_id, row['content'], row['url'], row['checked']))
+    
+    db.executemany(
+        'INSERT INTO items (id, checklist_id, parent_item_id, content, url, checked) VALUES (?, ?, ?, ?, ?, ?)',
+        params
+    )
+    return ids
+
+def encode_page_cursor(last_id):
+    """Encode the last id of a page as an opaque cursor"""
+    payload = json.dumps({'after': last_id}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).rstrip(b'=').decode('ascii')
+
+def decode_page_cursor(cursor):
+    """Return the id a cursor points after; raises ValueError if malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        after = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))['after']
+    except (TypeError, KeyError, UnicodeError, binascii.Error, json.JSONDecodeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(after, int) or isinstance(after, bool) or not fits_sqlite_integer(after):
+        raise ValueError('Invalid cursor')
+    return after
+
+def parse_page_args(args, max_limit):
+    """Read limit and cursor query arguments for keyset pagination.
+
+    Returns (limit, after_id); limit is None when the client did not ask
+    for pagination. Raises ValueError with a client-facing message.
+    """
+    limit = args.get('limit')
+    cursor = args.get('cursor')
+    if limit is None and cursor is None:
+        return None, 0
+    try:
+        limit = int(limit) if limit is not None else max_limit
+    except ValueError:
+        raise ValueError('Invalid limit')
+    if limit < 1:
+        raise ValueError('Invalid limit')
+    after_id = decode_page_cursor(cursor) if cursor else 0
+    return min(limit, max_limit), after_id
+
+def fetch_page(db, query, params, limit):
+    """Run a keyset query selecting limit + 1 rows ordered by id.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    rows = db.execute(query, (*params, limit + 1)).fetchall()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_page_cursor(rows[-1]['id'])
+    return rows, None
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+def requested_format(formats):
+    """Pick the response format from ?format= or the Accept header.
+
+    formats lists the supported names, the first being the default.
+    'ndjson' may also be requested with Accept: application/x-ndjson.
+    Raises ValueError for an unsupported ?format= value.
+    """
+    requested = request.args.get('format')
+    if requested is not None:
+        if requested not in formats:
+            raise ValueError('Invalid format')
+        return requested
+    if 'ndjson' in formats:
+        best = request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE])
+        if best == NDJSON_MIMETYPE:
+            return 'ndjson'
+    return formats[0]
+
+def iter_ndjson_rows(cursor, first=None, chunk_size=500):
+    """Yield NDJSON lines for the rows of an open cursor, a chunk at a time.
+
+    first, if given, is emitted as the opening line. Only chunk_size rows
+    are held in memory at once, however many the cursor returns.
+    """
+    encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    if first is not None:
+        yield encode(first) + '\n'
+    columns = [column[0] for column in cursor.description]
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield ''.join(encode(dict(zip(columns, row))) + '\n' for row in rows)
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that uses orjson when it is installed.
+
+    sqlite3.Row values serialize as objects, so routes can hand query
+    results to jsonify as they are. Each row still becomes a dict when the
+    encoder reaches it, which costs about as much as copying the rows up
+    front; it is a convenience, not a speedup. Output matches the stdlib
+    provider: sorted keys, compact separators. Pass use_orjson=False to
+    force the stdlib encoder.
+    """
+
+    def __init__(self, app, use_orjson=None):
+        super().__init__(app)
+        self.use_orjson = orjson is not None and use_orjson is not False
+
+    def default(self, o):
+        if isinstance(o, sqlite3.Row):
+            return dict(o)
+        return DefaultJSONProvider.default(o)
+
+    def _orjson_options(self, indent=False):
+        options = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumpb(self, obj):
+        """Serialize obj to compact UTF-8 JSON bytes"""
+        if self.use_orjson:
+            return orjson.dumps(obj, default=self.default, option=self._orjson_options())
+        return self.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if self.use_orjson and set(kwargs) <= {'separators'}:
+            return self.dumpb(obj).decode('utf-8')
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if self.use_orjson and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if not self.use_orjson:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=self.default, option=self._orjson_options(indent))
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
+
+# Response types worth compressing; images and fonts are already compressed
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript',
+    'application/json', NDJSON_MIMETYPE, 'image/svg+xml',
+}
+
+# Content-Encoding -> file suffix of the precompressed static variants
+STATIC_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+def choose_content_encoding(accept_encodings, brotli_enabled=True):
+    """Pick the best encoding the client accepts: br, then gzip, else None"""
+    offered = ['br', 'gzip'] if brotli_enabled and brotli is not None else ['gzip']
+    return accept_encodings.best_match(offered)
+
+def compress_body(data, encoding, level):
+    """Compress a complete response body with gzip or brotli"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+def iter_gzip(chunks, level):
+    """Gzip a streamed body chunk by chunk, flushing so each chunk goes out promptly"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def precompress_static(folder, min_size=1024):
+    """Write .gz (and .br when brotli is installed) next to each static file.
+
+    Uses the highest compression levels, since this runs once at build time.
+    Returns the list of files written.
+    """
+    written = []
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if not os.path.isfile(path) or name.endswith(tuple(suffix for _, suffix in STATIC_ENCODINGS)):
+            continue
+        if mimetypes.guess_type(name)[0] not in COMPRESSIBLE_MIMETYPES:
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < min_size:
+            continue
+        variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', brotli.compress(data, quality=11)))
+        for suffix, body in variants:
+            with open(path + suffix, 'wb') as f:
+                f.write(body)
+            written.append(path + suffix)
+    return written
+
+# Column order of SELECT * FROM items
+ITEM_COLUMNS = ('id', 'checklist_id', 'parent_item_id', 'content', 'url', 'checked', 'version')
+
+# Field order of the compact item encoding: [id, content, url, checked, subitems]
+COMPACT_ITEM_FIELDS = ('id', 'content', 'url', 'checked', 'subitems')
+
+def item_output_fields(fields, compact=False):
+    """Fields each returned item node carries, not counting subitems"""
+    if fields is not None:
+        return tuple(fields)
+    return COMPACT_ITEM_FIELDS[:-1] if compact else ITEM_COLUMNS
+
+def parse_item_fields(args):
+    """Read the fields query argument: a comma-separated list of item columns.
+
+    Returns None when absent, otherwise a tuple of ITEM_COLUMNS names that
+    always starts with id. Raises ValueError with a client-facing message.
+    """
+    fields = args.get('fields')
+    if fields is None:
+        return None
+    requested = [field.strip() for field in fields.split(',') if field.strip()]
+    if not requested or any(field not in ITEM_COLUMNS for field in requested):
+        raise ValueError('Invalid fields')
+    return tuple(dict.fromkeys(['id'] + requested))
+
+def item_select_list(fields, tree=False):
+    """SQL column list for the given item fields (validated names only).
+
+    Trees also need parent_item_id to place each node, even when the client
+    did not ask for it.
+    """
+    columns = list(fields or ITEM_COLUMNS)
+    if tree and 'parent_item_id' not in columns:
+        columns.append('parent_item_id')
+    return ', '.join(f'items.{column}' for column in columns)
+
+def build_item_tree(rows, columns=None, compact=False, fields=None):
+    """Build the item hierarchy in a single pass over rows.
+
+    rows are tuples or sqlite3.Row objects whose fields are named by columns
+    (taken from the first Row when omitted). Children are collected in a
+    parent-id -> list index, so a child may appear before its parent. With
+    compact=True each node is a list in COMPACT_ITEM_FIELDS order instead
+    of a dict. fields, if given, picks which columns each node carries (in
+    that order) ahead of its subitems.
+
+    Returns (roots, orphans): orphans are the top nodes of subtrees whose
+    parent is not among rows, each with its own descendants attached.
+    """
+    if not rows:
+        return [], []
+    if columns is None:
+        columns = tuple(rows[0].keys())
+    columns = tuple(columns)
+    
+    children = {}
+    get_children = children.get
+    roots = []
     
-    return root_items
+    if columns == ITEM_COLUMNS and fields is None:
+        # Fast path for full item rows: unpack positionally, no per-row zip
+        for item_id, checklist_id, parent_id, content, url, checked, version in rows:
+            subitems = get_children(item_id)
+            if subitems is None:
+                subitems = children[item_id] = []
+            if compact:
+                node = [item_id, content, url, checked, subitems]
+            else:
+                node = {'id': item_id, 'checklist_id': checklist_id, 'parent_item_id': parent_id,
+                        'content': content, 'url': url, 'checked': checked, 'version': version,
+                        'subitems': subitems}
+            if parent_id is None:
+                roots.append(node)
+            else:
+                siblings = get_children(parent_id)
+                if siblings is None:
+                    siblings = children[parent_id] = []
+                siblings.append(node)
+    else:
+        id_pos = columns.index('id')
+        parent_pos = columns.index('parent_item_id')
+        if fields is None:
+            fields = COMPACT_ITEM_FIELDS[:-1] if compact else columns
+        fields = tuple(fields)
+        positions = [columns.index(field) for field in fields]
+        pairs = list(zip(fields, positions))
+        for row in rows:
+            item_id = row[id_pos]
+            parent_id = row[parent_pos]
+            subitems = get_children(item_id)
+            if subitems is None:
+                subitems = children[item_id] = []
+            if compact:
+                node = [row[pos] for pos in positions]
+                node.append(subitems)
+            elif fields == columns:
+                node = dict(zip(columns, row))
+                node['subitems'] = subitems
+            else:
+                node = {field: row[pos] for field, pos in pairs}
+                node['subitems'] = subitems
+            if parent_id is None:
+                roots.append(node)
+            else:
+                siblings = get_children(parent_id)
+                if siblings is None:
+                    siblings = children[parent_id] = []
+                siblings.append(node)
+    
+    orphans = []
+    if len(children) > len(rows):
+        # Some parent ids were never seen as item ids
+        id_pos = columns.index('id')
+        ids = {row[id_pos] for row in rows}
+        for parent_id, nodes in children.items():
+            if parent_id not in ids:
+                orphans.extend(nodes)
+    return roots, orphans
+
+def compact_item_tree(roots, fields=None):
+    """Re-encode a tree of item dicts as nested lists in fields order.
+
+    Each node becomes [field values..., subitems]; fields defaults to the
+    COMPACT_ITEM_FIELDS encoding.
+    """
+    if fields is None:
+        fields = COMPACT_ITEM_FIELDS[:-1]
+    result = []
+    stack = [(roots, result)]
+    while stack:
+        nodes, out = stack.pop()
+        for node in nodes:
+            subitems = []
+            out.append([node[field] for field in fields] + [subitems])
+            if node['subitems']:
+                stack.append((node['subitems'], subitems))
+    return result
+
+def fetch_item_tree(db, checklist_id, fields=None, compact=False):
+    """Load a checklist's full item tree, selecting only the needed columns.
+
+    Nodes carry item_output_fields(fields, compact); orphans are left out
+    and logged.
+    """
+    cursor = db.execute(
+        f'SELECT {item_select_list(fields, tree=True)} FROM items WHERE checklist_id = ? ORDER BY id',
+        (checklist_id,)
+    )
+    columns = [column[0] for column in cursor.description]
+    roots, orphans = build_item_tree(cursor.fetchall(), columns, compact,
+                                     item_output_fields(fields, compact))
+    log_orphans(orphans, compact)
+    return roots
+
+def log_orphans(orphans, compact=False):
+    """Warn about item subtrees left out of a tree because their parent is missing"""
+    if orphans:
+        # id is the first field of every node encoding
+        ids = (node[0] if compact else node['id'] for node in orphans)
+        logger.warning('Skipped %d orphaned item subtree(s): %s', len(orphans), ', '.join(map(str, ids)))
+
+def organize_items_hierarchically(all_items):
+    """Organize items into a hierarchical structure.
+
+    Items whose parent is missing are left out and logged.
+    """
+    roots, orphans = build_item_tree(all_items)
+    log_orphans(orphans)
+    return roots
+
+def parse_subtree_args(args):
+    """Read the root and depth query arguments for partial tree loads.
+
+    Returns (root_id, depth); either is None when not given, and both are
+    None for a full tree. Raises ValueError with a client-facing message.
+    """
+    root_id = args.get('root')
+    depth = args.get('depth')
+    try:
+        root_id = int(root_id) if root_id is not None else None
+    except ValueError:
+        raise ValueError('Invalid root')
+    try:
+        depth = int(depth) if depth is not None else None
+    except ValueError:
+        raise ValueError('Invalid depth')
+    if root_id is not None and not fits_sqlite_integer(root_id):
+        raise ValueError('Invalid root')
+    if depth is not None and not 1 <= depth <= SQLITE_MAX_INTEGER:
+        raise ValueError('Invalid depth')
+    return root_id, depth
+
+def item_in_checklist(db, checklist_id, item_id):
+    """Whether item_id is an item of checklist_id"""
+    return db.execute('SELECT 1 FROM items WHERE id = ? AND checklist_id = ?',
+                      (item_id, checklist_id)).fetchone() is not None
+
+def fetch_item_subtree(db, checklist_id, root_id=None, depth=None, fields=None, compact=False):
+    """Load part of a checklist's item tree.
+
+    Returns the children of root_id (or the top-level items) nested depth
+    levels deep, or all the way down when depth is None. Every node carries
+    child_count and has_children, counted in the same query, so nodes cut
+    off at the depth limit can be expanded later with root=<their id>.
+    fields and compact select the node encoding as for fetch_item_tree.
+    """
+    if root_id is None:
+        start = 'SELECT id, 1 FROM items WHERE checklist_id = :checklist_id AND parent_item_id IS NULL'
+    else:
+        start = 'SELECT id, 1 FROM items WHERE parent_item_id = :root_id AND checklist_id = :checklist_id'
+    # UNION drops rows already visited, so a parent_item_id cycle ends the
+    # walk; without a depth limit depth stays 1 so revisits repeat exactly
+    cursor = db.execute(f'''
+        WITH RECURSIVE subtree(id, depth) AS (
+            {start}
+            UNION
+            SELECT items.id, subtree.depth + (:depth IS NOT NULL) FROM items
+            JOIN subtree ON items.parent_item_id = subtree.id
+            WHERE :depth IS NULL OR subtree.depth < :depth
+        )
+        SELECT {item_select_list(fields, tree=True)},
+               (SELECT COUNT(*) FROM items AS children WHERE children.parent_item_id = items.id) AS child_count
+        FROM items WHERE items.id IN (SELECT id FROM subtree)
+        ORDER BY items.id
+    ''', {'checklist_id': checklist_id, 'root_id': root_id, 'depth': depth})
+
+    columns = tuple(column[0] for column in cursor.description) + ('has_children',)
+    rows = [tuple(row) + (row['child_count'] > 0,) for row in cursor.fetchall()]
+    output = item_output_fields(fields, compact) + ('child_count', 'has_children')
+    roots, orphans = build_item_tree(rows, columns, compact, output)
+    # Below a root every top node's parent is the root itself, outside rows
+    return roots if root_id is None else orphans
 
 def delete_item_and_subitems(db, item_id):
-    """Recursively delete an item and all its subitems"""
-    # Find all subitems of this item
-    subitems = db.execute('SELECT id FROM items WHERE parent_item_id = ?', (item_id,)).fetchall()
+    """Delete an item and all its subitems in one statement.
+
+    Returns the ids of the rows removed. The walk uses UNION, so a
+    parent_item_id cycle ends it instead of looping forever.
+    """
+    rows = db.execute('''
+        DELETE FROM items WHERE id IN (
+            WITH RECURSIVE subtree(id) AS (
+                SELECT id FROM items WHERE id = ?
+                UNION
+                SELECT items.id FROM items JOIN subtree ON items.parent_item_id = subtree.id
+            )
+            SELECT id FROM subtree
+        )
+        RETURNING id
+    ''', (item_id,)).fetchall()
+    return [row[0] for row in rows]
+
+def bump_checklist_version(db, checklist_id):
+    """Mark a checklist as changed; call in the same transaction as the change"""
+    db.execute('UPDATE checklists SET version = version + 1 WHERE id = ?', (checklist_id,))
+
+def checklist_etag(checklist_id, version, variant=b''):
+    """Strong ETag for a checklist representation at a given version.
+
+    variant (the raw query string) distinguishes representations of the
+    same version, such as streamed and tree responses.
+    """
+    tag = f'checklist-{checklist_id}-v{version}'
+    if variant:
+        tag += f'-{zlib.crc32(variant):08x}'
+    return tag
+
+def format_variant(fmt, query_string):
+    """ETag variant of a representation: the raw query string, plus the
+    format when it is not the default JSON (it may come from Accept alone)
+    """
+    if fmt == 'json':
+        return query_string
+    return query_string + b'|' + fmt.encode()
+
+def with_etag(response, etag):
+    """Attach a strong ETag and require clients to revalidate before reuse.
+
+    The tagged routes negotiate their format from Accept, so caches must
+    key on it too.
+    """
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Accept')
+    return response
+
+def not_modified(etag):
+    """Empty 304 response for a matching If-None-Match"""
+    return with_etag(Response(status=304), etag)
+
+def version_conflict(current, etag):
+    """412 response carrying the current state of a resource and its ETag"""
+    response = jsonify({'error': 'Version mismatch', 'current': current})
+    response.status_code = 412
+    response.set_etag(etag)
+    return response
+
+def item_etag(item_id, version):
+    """Strong ETag for an item at a given version"""
+    return f'item-{item_id}-v{version}'
+
+def expected_version(if_match, data, entity_tag):
+    """Version a conditional write expects, or None for an unconditional one.
+
+    The version comes from If-Match, which must hold an ETag this server
+    issued for the target (entity_tag is its prefix, e.g. 'item-5'), or
+    else from the body's version field. Raises ValueError with a
+    client-facing message for a malformed or out-of-range body field.
+    """
+    if if_match:
+        if if_match.star_tag:
+            return None
+        prefix = f'{entity_tag}-v'
+        for tag in if_match.as_set(include_weak=True):
+            if tag.startswith(prefix):
+                # Checklist ETags may carry a -variant suffix after the version
+                version = tag[len(prefix):].split('-', 1)[0]
+                if version.isascii() and version.isdigit() and fits_sqlite_integer(int(version)):
+                    return int(version)
+        # None of the tags names a version of this entity, so none can match; versions start at 1
+        return 0
+    version = data.get('version') if isinstance(data, dict) else None
+    if version is None:
+        return None
+    if isinstance(version, bool) or not isinstance(version, int) or not fits_sqlite_integer(version):
+        raise ValueError('Invalid version')
+    return version
+
+def delete_checklist_items(db, checklist_id):
+    """Delete every item of a checklist, returning the number of rows removed"""
+    return db.execute('DELETE FROM items WHERE checklist_id = ?', (checklist_id,)).rowcount
+
+class CursorExpired(Exception):
+    """A sync cursor points at change log entries that were compacted away"""
+
+def latest_change_id(db, user_id):
+    """Cursor for the user's current position in the change log.
+
+    This is the id of the user's newest entry, but never below the
+    compaction point: a user whose entries were all compacted away (or who
+    has none yet) would otherwise get a cursor that is already expired.
+    """
+    row = db.execute(
+        'SELECT MAX(COALESCE((SELECT MAX(id) FROM changes WHERE user_id = ?), 0), '
+        'COALESCE((SELECT through_id FROM changes_compacted), 0))',
+        (user_id,)
+    ).fetchone()
+    return row[0] or 0
+
+def fetch_changes(db, user_id, after_id, limit):
+    """Collect a user's changes logged after after_id, at most limit entries.
+
+    Entries for the same checklist or item collapse to the latest one.
+    Upserts carry the current row, so a row deleted after the page shows
+    up as a tombstone on a later page instead. Returns (payload, last_id)
+    where last_id is the id to resume from. Raises CursorExpired when
+    compaction already dropped entries after after_id.
+    """
+    compacted = db.execute('SELECT through_id FROM changes_compacted').fetchone()
+    if compacted and after_id < compacted[0]:
+        raise CursorExpired()
+    
+    entries = db.execute(
+        'SELECT id, entity, entity_id, op FROM changes WHERE user_id = ? AND id > ? ORDER BY id LIMIT ?',
+        (user_id, after_id, limit + 1)
+    ).fetchall()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    
+    latest = {}
+    for entry in entries:
+        latest[entry['entity'], entry['entity_id']] = entry['op']
+    upserted = {'checklist': [], 'item': []}
+    deleted = {'checklist': [], 'item': []}
+    for (entity, entity_id), op in latest.items():
+        (upserted if op == 'upsert' else deleted)[entity].append(entity_id)
+    
+    checklists = db.execute(
+        'SELECT id, title, total_items, checked_items, version FROM checklists '
+        'WHERE user_id = ? AND id IN (SELECT value FROM json_each(?)) ORDER BY id',
+        (user_id, json.dumps(upserted['checklist']))
+    ).fetchall() if upserted['checklist'] else []
+    items = db.execute(
+        'SELECT items.* FROM items JOIN checklists ON checklists.id = items.checklist_id '
+        'WHERE checklists.user_id = ? AND items.id IN (SELECT value FROM json_each(?)) ORDER BY items.id',
+        (user_id, json.dumps(upserted['item']))
+    ).fetchall() if upserted['item'] else []
+    
+    payload = {
+        'checklists': checklists,
+        'items': items,
+        'deleted_checklists': sorted(deleted['checklist']),
+        'deleted_items': sorted(deleted['item']),
+        'has_more': has_more,
+    }
+    return payload, entries[-1]['id'] if entries else after_id
+
+def compact_changes(db, max_age, now=None):
+    """Shrink the change log; call inside a write transaction.
+
+    Entries superseded by a later entry for the same checklist or item are
+    always safe to drop, since sync only reports the latest one. Entries
+    older than max_age seconds are dropped too, and cursors from before
+    them expire. Returns the number of entries removed.
+    """
+    now = time.time() if now is None else now
+    removed = db.execute('''
+        DELETE FROM changes WHERE id < (
+            SELECT MAX(later.id) FROM changes AS later
+            WHERE later.entity = changes.entity AND later.entity_id = changes.entity_id
+        )
+    ''').rowcount
+    expired = db.execute('SELECT MAX(id) FROM changes WHERE created_at < ?', (int(now - max_age),)).fetchone()[0]
+    if expired is not None:
+        removed += db.execute('DELETE FROM changes WHERE id <= ?', (expired,)).rowcount
+        db.execute('UPDATE changes_compacted SET through_id = MAX(through_id, ?)', (expired,))
+    return removed
+
+class GroupCommitWriter:
+    """Run small write operations on one writer thread, committing them in groups.
+
+    submit() blocks until the operation's group has committed, then returns
+    the operation's result or raises its exception. The writer collects up
+    to max_batch queued operations, waiting at most max_delay seconds after
+    the first. A burst of toggles then costs one transaction and one fsync
+    instead of one each. Every operation runs in its own savepoint, so a
+    failing one does not undo the rest of its group. The thread starts on
+    demand and exits after IDLE_TIMEOUT seconds without work.
+    """
+
+    IDLE_TIMEOUT = 5.0
+
+    def __init__(self, db_path, pragmas=None, max_batch=64, max_delay=0.002):
+        self.db_path = db_path
+        self.pragmas = pragmas
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.batches = 0
+        self.operations = 0
+        self.largest_batch = 0
+
+    def submit(self, operation, *args):
+        """Run operation(db, *args) in the next group commit and return its result"""
+        future = Future()
+        self._queue.put((operation, args, future))
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+                self._thread.start()
+        return future.result()
+
+    def _run(self):
+        db = get_db_connection(self.db_path, self.pragmas)
+        db.isolation_level = None  # Transactions are managed explicitly in _commit
+        try:
+            while True:
+                try:
+                    batch = [self._queue.get(timeout=self.IDLE_TIMEOUT)]
+                except queue.Empty:
+                    with self._lock:
+                        if self._queue.empty():
+                            self._thread = None
+                            return
+                    continue
+                deadline = time.monotonic() + self.max_delay
+                while len(batch) < self.max_batch:
+                    try:
+                        batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                    except queue.Empty:
+                        break
+                self._commit(db, batch)
+        finally:
+            db.close()
+
+    def _commit(self, db, batch):
+        outcomes = []
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            for operation, args, future in batch:
+                db.execute('SAVEPOINT operation')
+                try:
+                    outcomes.append((future, operation(db, *args), None))
+                except Exception as e:
+                    db.execute('ROLLBACK TO operation')
+                    outcomes.append((future, None, e))
+                db.execute('RELEASE operation')
+            db.execute('COMMIT')
+        except sqlite3.Error as e:
+            if db.in_transaction:
+                db.execute('ROLLBACK')
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        
+        self.batches += 1
+        self.operations += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def stats(self):
+        return {'batches': self.batches, 'operations': self.operations, 'largest_batch': self.largest_batch}
+
+# Ownership-scoped item mutations. Each runs as a single statement: the
+# checklists.user_id check sits in a subquery of the WHERE clause and
+# RETURNING hands back the result, so there is no separate SELECT before or
+# after. Every write bumps the item's version. A None result means no item
+# with that id is visible to the user, or it is no longer at the expected
+# version; routes tell the two apart with fetch_owned_item. Callers bump
+# the checklist version and commit.
+
+# Matches :item_id when it belongs to one of :user_id's checklists (and to
+# :checklist_id and :version, unless those are NULL)
+OWNED_ITEM_CLAUSE = '''
+    id = :item_id
+    AND (:checklist_id IS NULL OR checklist_id = :checklist_id)
+    AND (:version IS NULL OR version = :version)
+    AND checklist_id IN (SELECT id FROM checklists WHERE user_id = :user_id)
+'''
+
+# Columns a client may change on an item
+UPDATABLE_ITEM_COLUMNS = ('content', 'url', 'checked')
+
+def owned_item_params(item_id, user_id, checklist_id=None, version=None):
+    """Parameters for OWNED_ITEM_CLAUSE"""
+    return {'item_id': item_id, 'checklist_id': checklist_id, 'version': version, 'user_id': user_id}
+
+def fetch_owned_item(db, item_id, user_id, checklist_id=None):
+    """Return the current row of an item the user owns, or None"""
+    return db.execute(f'SELECT * FROM items WHERE {OWNED_ITEM_CLAUSE}',
+                      owned_item_params(item_id, user_id, checklist_id)).fetchone()
+
+def toggle_item_checked(db, item_id, user_id, checklist_id=None, version=None):
+    """Flip an item's checked flag in place.
+
+    checked = 1 - checked is evaluated by SQLite under the write lock, so
+    concurrent toggles cannot lose an update. Returns (checklist_id,
+    new_state, new_version) or None.
+    """
+    rows = db.execute(
+        f'UPDATE items SET checked = 1 - checked, version = version + 1 WHERE {OWNED_ITEM_CLAUSE} '
+        'RETURNING checklist_id, checked, version',
+        owned_item_params(item_id, user_id, checklist_id, version)
+    ).fetchall()  # Drain RETURNING rows so the statement completes before commit
+    if not rows:
+        return None
+    bump_checklist_version(db, rows[0]['checklist_id'])
+    return tuple(rows[0])
+
+def update_owned_item(db, item_id, user_id, changes, checklist_id=None, version=None):
+    """Apply changes (UPDATABLE_ITEM_COLUMNS -> value) to an item.
+
+    Returns the updated row or None.
+    """
+    assignments = ''.join(f'{column} = :set_{column}, ' for column in changes
+                          if column in UPDATABLE_ITEM_COLUMNS)
+    params = {f'set_{column}': value for column, value in changes.items()}
+    params.update(owned_item_params(item_id, user_id, checklist_id, version))
+    rows = db.execute(
+        f'UPDATE items SET {assignments}version = version + 1 WHERE {OWNED_ITEM_CLAUSE} RETURNING *', params
+    ).fetchall()
+    if not rows:
+        return None
+    bump_checklist_version(db, rows[0]['checklist_id'])
+    return rows[0]
+
+def delete_owned_item(db, item_id, user_id, checklist_id=None, version=None):
+    """Delete an item and its whole subtree.
+
+    version, if given, is checked on the item itself, not its descendants.
+    As in delete_item_and_subitems, UNION ends the walk on a cycle.
+    Returns (checklist_id, number of rows removed) or None.
+    """
+    rows = db.execute(f'''
+        DELETE FROM items WHERE id IN (
+            WITH RECURSIVE subtree(id) AS (
+                SELECT id FROM items WHERE {OWNED_ITEM_CLAUSE}
+                UNION
+                SELECT items.id FROM items JOIN subtree ON items.parent_item_id = subtree.id
+            )
+            SELECT id FROM subtree
+        )
+        RETURNING checklist_id
+    ''', owned_item_params(item_id, user_id, checklist_id, version)).fetchall()
+    if not rows:
+        return None
+    bump_checklist_version(db, rows[0]['checklist_id'])
+    return rows[0]['checklist_id'], len(rows)
+
+# One row per change log entry, with the current state of upserted rows
+CHANGE_EVENTS_QUERY = '''
+    SELECT changes.id AS change_id, changes.checklist_id, changes.entity, changes.entity_id, changes.op,
+           items.id AS item_id, items.parent_item_id, items.content, items.url, items.checked, items.version,
+           checklists.id AS list_id, checklists.title
+    FROM changes
+    LEFT JOIN items ON changes.entity = 'item' AND changes.op = 'upsert' AND items.id = changes.entity_id
+    LEFT JOIN checklists ON changes.entity = 'checklist' AND changes.op = 'upsert'
+                            AND checklists.id = changes.entity_id
+'''
+
+def change_event(row):
+    """Turn a CHANGE_EVENTS_QUERY row into (change_id, event name, data).
+
+    Returns None for an upsert whose row is already gone; its tombstone
+    follows later in the log.
+    """
+    data = {'op': row['op'], 'id': row['entity_id'], 'checklist_id': row['checklist_id']}
+    if row['op'] == 'upsert':
+        if row['entity'] == 'item':
+            if row['item_id'] is None:
+                return None
+            data.update(parent_item_id=row['parent_item_id'], content=row['content'],
+                        url=row['url'], checked=row['checked'], version=row['version'])
+        else:
+            if row['list_id'] is None:
+                return None
+            data['title'] = row['title']
+    return row['change_id'], row['entity'], data
+
+def format_sse(event_id, event, data):
+    """Encode one Server-Sent Events message; data must already be JSON text"""
+    return f'id: {event_id}\nevent: {event}\ndata: {data}\n\n'
+
+class TooManySubscribers(Exception):
+    """The change hub already serves as many subscribers as it may"""
+
+class ChangeSubscription:
+    """A live subscriber's bounded queue of (change_id, event, data) tuples"""
+
+    def __init__(self, checklist_id, queue_size):
+        self.checklist_id = checklist_id
+        self.queue = queue.Queue(queue_size)
+        self.overflowed = False
+
+class ChangeHub:
+    """Fan change log entries out to live subscribers, such as SSE streams.
+
+    A single poller thread tails the changes table over its own connection,
+    however many subscribers there are, and only runs while someone is
+    subscribed. Writers call notify() after committing to wake it at once;
+    otherwise it polls every poll_interval seconds, which also picks up
+    writes from other processes. A subscriber whose queue fills up is
+    marked overflowed and dropped instead of slowing everyone down. At most
+    max_subscribers (0 for no limit) may be registered at once.
+    """
+
+    BATCH = 500
+
+    def __init__(self, db_path, pragmas=None, poll_interval=1.0, queue_size=256, max_subscribers=0):
+        self.db_path = db_path
+        self.pragmas = pragmas
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.rejected = 0
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._position = 0
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, checklist_id, db):
+        """Register a subscriber; db is used to find the log position if the poller starts.
+
+        Raises TooManySubscribers when max_subscribers are already registered.
+        """
+        subscription = ChangeSubscription(checklist_id, self.queue_size)
+        with self._lock:
+            if self.max_subscribers and self._count_locked() >= self.max_subscribers:
+                self.rejected += 1
+                raise TooManySubscribers()
+            self._subscribers.setdefault(checklist_id, set()).add(subscription)
+            if self._thread is None:
+                # Read the position now so nothing logged after this call is missed
+                self._position = db.execute('SELECT COALESCE(MAX(id), 0) FROM changes').fetchone()[0]
+                self._thread = threading.Thread(target=self._run, name='change-hub', daemon=True)
+                self._thread.start()
+        return subscription
+
+    def _count_locked(self):
+        return sum(len(group) for group in self._subscribers.values())
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.checklist_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.checklist_id]
+        self._wake.set()
+
+    def notify(self):
+        """Wake the poller early; call after committing a change"""
+        if self._thread is not None:
+            self._wake.set()
+
+    def _publish(self, checklist_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(checklist_id, ()))
+        for subscription in subscribers:
+            if subscription.overflowed:
+                continue
+            try:
+                subscription.queue.put_nowait(event)
+                self.published += 1
+            except queue.Full:
+                subscription.overflowed = True
+                self.dropped += 1
+
+    def _run(self):
+        db = get_db_connection(self.db_path, self.pragmas)
+        try:
+            while True:
+                with self._lock:
+                    if not self._subscribers:
+                        self._thread = None
+                        return
+                rows = db.execute(CHANGE_EVENTS_QUERY + 'WHERE changes.id > ? ORDER BY changes.id LIMIT ?',
+                                  (self._position, self.BATCH)).fetchall()
+                for row in rows:
+                    self._position = row['change_id']
+                    event = change_event(row)
+                    if event is not None:
+                        self._publish(row['checklist_id'], event)
+                if len(rows) == self.BATCH:
+                    continue
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+        except sqlite3.Error:
+            logger.exception('Change hub poller stopped')
+            with self._lock:
+                self._thread = None
+        finally:
+            db.close()
+
+    def stats(self):
+        with self._lock:
+            subscribers = self._count_locked()
+        return {'subscribers': subscribers, 'published': self.published, 'dropped': self.dropped,
+                'rejected': self.rejected}
+
+# Bulk export and import. An export is a stream of flat records, each a
+# JSON object with a "type": one header, then every user, then each
+# checklist followed by its items in id order (so parents precede their
+# children). The same records are written one per line (NDJSON) or as the
+# elements of a single JSON array; both are produced and read with
+# constant memory.
+EXPORT_FORMAT = 'smartchecklist-export'
+EXPORT_FORMATS = ('ndjson', 'json')
+
+def iter_export_records(db, username=None):
+    """Yield the export records of all data, or of one user's data.
+
+    Run inside a read transaction for a consistent snapshot. Raises
+    ValueError if username does not exist.
+    """
+    if username is None:
+        users = db.execute('SELECT id, username, password FROM users ORDER BY id')
+        checklists_query, params = 'SELECT id, user_id, title FROM checklists ORDER BY id', ()
+    else:
+        user = db.execute('SELECT id, username, password FROM users WHERE username = ?', (username,)).fetchone()
+        if user is None:
+            raise ValueError(f'Unknown user {username!r}')
+        users = [user]
+        checklists_query = 'SELECT id, user_id, title FROM checklists WHERE user_id = ? ORDER BY id'
+        params = (user['id'],)
+    
+    # Upper bounds of the exported ids let an import reserve its id range up front
+    max_ids = db.execute(
+        'SELECT (SELECT MAX(id) FROM checklists), (SELECT MAX(id) FROM items)'
+    ).fetchone()
+    yield {'type': 'header', 'format': EXPORT_FORMAT, 'version': 1,
+           'max_checklist_id': max_ids[0] or 0, 'max_item_id': max_ids[1] or 0}
+    for user in users:
+        yield {'type': 'user', 'id': user['id'], 'username': user['username'], 'password': user['password']}
+    for checklist in db.execute(checklists_query, params):
+        yield {'type': 'checklist', 'id': checklist['id'], 'user_id': checklist['user_id'],
+               'title': checklist['title']}
+        for item in db.execute(
+            'SELECT id, parent_item_id, content, url, checked FROM items WHERE checklist_id = ? ORDER BY id',
+            (checklist['id'],)
+        ):
+            yield {'type': 'item', 'id': item['id'], 'checklist_id': checklist['id'],
+                   'parent_item_id': item['parent_item_id'], 'content': item['content'],
+                   'url': item['url'], 'checked': item['checked']}
+
+def write_export(records, out, fmt, dumpb):
+    """Write records to the binary stream out as NDJSON or a JSON array"""
+    if fmt == 'ndjson':
+        for record in records:
+            out.write(dumpb(record) + b'\n')
+        return
+    out.write(b'[')
+    separator = b'\n'
+    for record in records:
+        out.write(separator + dumpb(record))
+        separator = b',\n'
+    out.write(b'\n]\n')
+
+def iter_json_array(stream, prefix='', chunk_size=1 << 16):
+    """Yield the elements of a JSON array read incrementally from a text stream.
+
+    prefix is text already consumed from the stream, such as a sniffed '['.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos = prefix, 0
+    
+    def more():
+        nonlocal buffer, pos
+        chunk = stream.read(chunk_size)
+        buffer, pos = buffer[pos:] + chunk, 0
+        return bool(chunk)
+    
+    def peek():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if not more():
+                return ''
+    
+    if peek() != '[':
+        raise ValueError('Expected a JSON array')
+    pos += 1
+    if peek() == ']':
+        return
+    while True:
+        peek()
+        while True:
+            try:
+                value, pos = decoder.raw_decode(buffer, pos)
+                break
+            except json.JSONDecodeError:
+                # Most likely the element continues in the next chunk
+                if not more():
+                    raise ValueError('Truncated or malformed JSON array')
+        yield value
+        delimiter = peek()
+        pos += 1
+        if delimiter == ']':
+            return
+        if delimiter != ',':
+            raise ValueError('Malformed JSON array')
+
+def read_export_records(stream, loads=json.loads):
+    """Yield records from a text stream holding an export in either format"""
+    first = stream.read(1)
+    while first.isspace():
+        first = stream.read(1)
+    if first == '[':
+        yield from iter_json_array(stream, first)
+        return
+    for number, line in enumerate(itertools.chain([first + stream.readline()], stream), 1):
+        if line.strip():
+            try:
+                yield loads(line)
+            except ValueError:
+                raise ValueError(f'Invalid JSON on line {number}')
+
+def reserve_ids(db, table, count):
+    """Claim count AUTOINCREMENT ids of table; returns the offset to add to 1..count"""
+    row = db.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,)).fetchone()
+    offset = max(row[0] if row else 0,
+                 db.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}').fetchone()[0])
+    if row:
+        db.execute('UPDATE sqlite_sequence SET seq = ? WHERE name = ?', (offset + count, table))
+    else:
+        db.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)', (table, offset + count))
+    return offset
+
+def import_records(db, records, user_id=None, chunk_size=5000, progress=None):
+    """Insert exported records as new checklists and items.
+
+    Every exported id is shifted by an offset into an id range reserved in
+    the first transaction, so ids (and parent references) are remapped with
+    arithmetic instead of a lookup table and concurrent writers cannot
+    collide with the rows still to come. Users are matched by username and
+    created when missing, unless user_id assigns every checklist to one
+    account. Rows are written with executemany in transactions of at most
+    chunk_size items; progress(counts) is called after each commit. Returns
+    the counts. Raises ValueError on malformed input, leaving the chunks
+    committed before it in place.
+    """
+    counts = {'users': 0, 'checklists': 0, 'items': 0}
+    checklist_rows, item_rows = [], []
+    records = iter(records)
     
-    # Recursively delete subitems
-    for subitem in subitems:
-        delete_item_and_subitems(db, subitem['id'])
+    header = next(records, None)
+    if not isinstance(header, dict) or header.get('type') != 'header' or header.get('format') != EXPORT_FORMAT:
+        raise ValueError('Input does not start with a smartchecklist export header')
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        checklist_offset = reserve_ids(db, 'checklists', header['max_checklist_id'])
+        item_offset = reserve_ids(db, 'items', header['max_item_id'])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    users = {}
+    checklist_id = None
+    
+    def flush():
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.executemany('INSERT INTO checklists (id, user_id, title) VALUES (?, ?, ?)', checklist_rows)
+            db.executemany(
+                'INSERT INTO items (id, checklist_id, parent_item_id, content, url, checked) VALUES (?, ?, ?, ?, ?, ?)',
+                item_rows
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        counts['checklists'] += len(checklist_rows)
+        counts['items'] += len(item_rows)
+        checklist_rows.clear()
+        item_rows.clear()
+        if progress is not None:
+            progress(counts)
     
-    # Delete the item itself
-    db.execute('DELETE FROM items WHERE id = ?', (item_id,))
+    for number, record in enumerate(records, 2):
+        try:
+            kind = record['type']
+            if kind in ('checklist', 'item') and not 1 <= record['id'] <= header[f'max_{kind}_id']:
+                raise ValueError(f'id {record["id"]} is outside the range in the header')
+            if kind == 'item':
+                parent_id = record['parent_item_id']
+                if record['checklist_id'] != checklist_id:
+                    raise ValueError('item does not follow its checklist')
+                if parent_id is not None and not 1 <= parent_id < record['id']:
+                    raise ValueError('parent must precede the item')
+                item_rows.append((
+                    record['id'] + item_offset,
+                    checklist_id + checklist_offset,
+                    None if parent_id is None else parent_id + item_offset,
+                    record['content'], record.get('url'), 1 if record.get('checked') else 0,
+                ))
+                if len(item_rows) >= chunk_size:
+                    flush()
+            elif kind == 'checklist':
+                owner = user_id if user_id is not None else users[record['user_id']]
+                checklist_id = record['id']
+                checklist_rows.append((checklist_id + checklist_offset, owner, record['title']))
+            elif kind == 'user':
+                if user_id is None:
+                    existing = db.execute('SELECT id FROM users WHERE username = ?',
+                                          (record['username'],)).fetchone()
+                    if existing is None:
+                        cursor = db.execute('INSERT INTO users (username, password) VALUES (?, ?)',
+                                            (record['username'], record['password']))
+                        db.commit()
+                        existing = (cursor.lastrowid,)
+                        counts['users'] += 1
+                    users[record['id']] = existing[0]
+            else:
+                raise ValueError(f'unknown type {kind!r}')
+        except (KeyError, TypeError) as e:
+            raise ValueError(f'Invalid record {number}: missing or malformed {e}')
+        except ValueError as e:
+            raise ValueError(f'Invalid record {number}: {e}')
+    if checklist_rows or item_rows:
+        flush()
+    return counts
 
 def api_login_required(f):
     """Decorator for API routes that require authentication"""
@@ -152,13 +1960,40 @@ def create_app(config=None):
     # Default configuration
     app.config['SECRET_KEY'] = os.urandom(24)  # Generate a random secret key
     app.config['DATABASE'] = os.path.join(app.instance_path, 'smartchecklist.sqlite')
+    app.config['DATABASE_POOL_SIZE'] = 4  # Idle connections kept per worker thread
+    app.config['DATABASE_PRAGMAS'] = DEFAULT_PRAGMA_PROFILE  # See DATABASE_PRAGMA_PROFILES
+    app.config['USER_CACHE_SIZE'] = 1024  # Logged-in users kept in memory; 0 disables
+    app.config['USER_CACHE_TTL'] = 60  # Seconds before a cached user is reloaded
+    app.config['BATCH_MAX_ITEMS'] = 5000  # Upper bound for one batch request
+    app.config['PAGE_MAX_LIMIT'] = 1000  # Largest page a paginated listing returns
+    app.config['TREE_CACHE_MAX_BYTES'] = 32 * 1024 * 1024  # Rendered checklist cache; 0 disables
+    app.config['TREE_CACHE_MAX_ENTRIES'] = 1024
+    app.config['COMPRESS_MIN_SIZE'] = 1024  # Smallest body worth compressing; 0 compresses all
+    app.config['COMPRESS_LEVEL'] = 4  # Cheap gzip level for dynamic bodies; 0 disables compression
+    app.config['COMPRESS_BROTLI_QUALITY'] = 4  # Used when the optional brotli package is installed
+    app.config['JSON_USE_ORJSON'] = True  # Serialize with orjson when it is installed
+    app.config['STATS_USERS'] = ()  # Usernames allowed to read /api/stats; empty hides it from everyone
+    app.config['SYNC_RETENTION'] = 30 * 24 * 3600  # Seconds of change log kept for delta sync
+    app.config['SSE_HEARTBEAT'] = 15  # Seconds between keep-alive comments on idle event streams
+    app.config['SSE_QUEUE_SIZE'] = 256  # Undelivered events per stream before it is reset
+    app.config['SSE_POLL_INTERVAL'] = 1.0  # Seconds between change log polls without a local write
+    app.config['SSE_MAX_STREAMS'] = 16  # Open event streams per process (0 = no limit); keep below the WSGI thread count
+    app.config['WRITE_GROUP_COMMIT'] = False  # Coalesce toggles into shared transactions
+    app.config['WRITE_BATCH_MAX'] = 64  # Most operations committed together
+    app.config['WRITE_BATCH_DELAY'] = 0.002  # Seconds the writer waits to fill a group
+    app.config['IDEMPOTENCY_TTL'] = 24 * 3600  # Seconds a response is replayed for its Idempotency-Key
+    app.config['IDEMPOTENCY_MAX_ENTRIES'] = 10000
+    app.config['IDEMPOTENCY_MAX_BYTES'] = 8 * 1024 * 1024  # Stored response bodies; 0 disables keys
+    app.config['IDEMPOTENCY_WAIT'] = 10  # Seconds a duplicate waits for the request still running
     
     # Load additional configuration if provided
     if config:
         app.config.update(config)
     
-    # Ensure the instance folder exists
-    os.makedirs(app.instance_path, exist_ok=True)
+    app.json = FastJSONProvider(app, use_orjson=app.config['JSON_USE_ORJSON'])
+    
+    # Ensure the folder holding the database exists
+    os.makedirs(os.path.dirname(os.path.abspath(app.config['DATABASE'])), exist_ok=True)
 
     # Initialize Flask-Login
     login_manager = LoginManager()
@@ -170,17 +2005,246 @@ def create_app(config=None):
             self.id = id
             self.username = username
 
+    pool = ConnectionPool(
+        app.config['DATABASE'],
+        app.config['DATABASE_POOL_SIZE'],
+        app.config['DATABASE_PRAGMAS'],
+    )
+    app.extensions['db_pool'] = pool
+
     def get_db():
-        db = sqlite3.connect(app.config['DATABASE'])
-        db.row_factory = sqlite3.Row
-        return db
+        """Return the connection for the current app context, acquiring one from the pool"""
+        if 'db' not in g:
+            g.db = pool.acquire()
+        return g.db
+
+    @app.teardown_appcontext
+    def close_db(exception=None):
+        db = g.pop('db', None)
+        if db is not None:
+            pool.release(db)
+
+    # Flask-Login loads the user on every authenticated request. Anything that
+    # changes or deletes a user must call user_cache.invalidate(str(user_id)).
+    user_cache = LRUCache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+    app.extensions['user_cache'] = user_cache
+
+    # Built trees and rendered bodies of checklists, keyed by (id, version) so a
+    # stale entry can never be served. Mutation routes still drop a checklist's
+    # entries explicitly through checklist_changed to free the memory early.
+    tree_cache = LRUCache(
+        max_entries=app.config['TREE_CACHE_MAX_ENTRIES'] if app.config['TREE_CACHE_MAX_BYTES'] else 0,
+        max_bytes=app.config['TREE_CACHE_MAX_BYTES'],
+        sizeof=CachedChecklist.sizeof,
+    )
+    app.extensions['tree_cache'] = tree_cache
+
+    def checklist_changed(checklist_id):
+        """Drop cached trees and renderings of a checklist after a committed change"""
+        tree_cache.invalidate_matching(lambda key: key[0] == checklist_id)
+
+    def cached_checklist(db, checklist):
+        """Return the cache entry for a checklist row, building the tree on a miss"""
+        key = (checklist['id'], checklist['version'])
+        entry = tree_cache.get(key)
+        if entry is None:
+            all_items = db.execute(
+                'SELECT * FROM items WHERE checklist_id = ? ORDER BY id',
+                (checklist['id'],)
+            ).fetchall()
+            entry = CachedChecklist(organize_items_hierarchically(all_items), len(all_items))
+            tree_cache.set(key, entry)
+        return entry
+
+    def cached_rendering(db, checklist, name, render):
+        """Return the rendered body name for a checklist, rendering it on a miss"""
+        entry = cached_checklist(db, checklist)
+        body = entry.renderings.get(name)
+        if body is None:
+            body = render(entry.tree)
+            entry.renderings[name] = body
+            # Store again so the cache accounts for the new body
+            tree_cache.set((checklist['id'], checklist['version']), entry)
+        return body
+
+    def checklist_conflict(db, checklist_id):
+        """404 if the user has no such checklist, otherwise 412 with its current state"""
+        current = db.execute(
+            'SELECT id, title, total_items, checked_items, version FROM checklists WHERE id = ? AND user_id = ?',
+            (checklist_id, current_user.id)
+        ).fetchone()
+        if current is None:
+            return jsonify({'error': 'Checklist not found'}), 404
+        return version_conflict(current, checklist_etag(checklist_id, current['version']))
+
+    def item_conflict(db, checklist_id, item_id):
+        """404 if the user has no such item, otherwise 412 with its current state"""
+        current = fetch_owned_item(db, item_id, current_user.id, checklist_id)
+        if current is None:
+            return jsonify({'error': 'Item not found'}), 404
+        return version_conflict(current, item_etag(item_id, current['version']))
+
+    # Optional single writer that commits high-frequency writes in groups
+    write_queue = None
+    if app.config['WRITE_GROUP_COMMIT']:
+        write_queue = GroupCommitWriter(
+            app.config['DATABASE'],
+            app.config['DATABASE_PRAGMAS'],
+            max_batch=app.config['WRITE_BATCH_MAX'],
+            max_delay=app.config['WRITE_BATCH_DELAY'],
+        )
+    app.extensions['write_queue'] = write_queue
+
+    def run_write(operation, *args):
+        """Run operation(db, *args) and commit, through the write queue when enabled"""
+        if write_queue is not None:
+            return write_queue.submit(operation, *args)
+        db = get_db()
+        try:
+            result = operation(db, *args)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return result
+
+    # Responses of creating POSTs by (user id, Idempotency-Key), so a client
+    # retrying after a lost response gets the original result, not a duplicate
+    idempotency_store = None
+    if app.config['IDEMPOTENCY_MAX_BYTES']:
+        idempotency_store = IdempotencyStore(
+            max_entries=app.config['IDEMPOTENCY_MAX_ENTRIES'],
+            ttl=app.config['IDEMPOTENCY_TTL'],
+            max_bytes=app.config['IDEMPOTENCY_MAX_BYTES'],
+        )
+    app.extensions['idempotency_store'] = idempotency_store
+
+    def idempotent(f):
+        """Decorator replaying the stored response when an Idempotency-Key repeats"""
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            key = request.headers.get('Idempotency-Key')
+            if key is None or idempotency_store is None:
+                return f(*args, **kwargs)
+            if not key or len(key) > 255:
+                return jsonify({'error': 'Idempotency-Key must be 1 to 255 characters'}), 400
+            
+            # A key may only be reused for the very same request
+            fingerprint = hashlib.sha256(
+                b'\0'.join((request.method.encode(), request.path.encode(), request.get_data()))
+            ).hexdigest()
+            store_key = (current_user.id, key)
+            try:
+                stored = idempotency_store.claim(store_key, app.config['IDEMPOTENCY_WAIT'])
+            except IdempotencyInProgress:
+                return jsonify({'error': 'A request with this Idempotency-Key is still in progress'}), 409
+            if stored is not None:
+                if stored.fingerprint != fingerprint:
+                    return jsonify({'error': 'Idempotency-Key was already used for a different request'}), 422
+                response = Response(stored.body, status=stored.status, headers=stored.headers)
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+            
+            stored = None
+            try:
+                response = app.make_response(f(*args, **kwargs))
+                # Server errors are not recorded so that a retry can succeed
+                if response.status_code < 500 and not response.is_streamed:
+                    headers = [(name, value) for name, value in response.headers.items()
+                               if name in ('Content-Type', 'Location')]
+                    stored = StoredResponse(fingerprint, response.status_code, response.get_data(), headers)
+            finally:
+                idempotency_store.release(store_key, stored)
+            return response
+        return decorated_function
+
+    # Live change fan-out for the checklist event streams
+    change_hub = ChangeHub(
+        app.config['DATABASE'],
+        app.config['DATABASE_PRAGMAS'],
+        poll_interval=app.config['SSE_POLL_INTERVAL'],
+        queue_size=app.config['SSE_QUEUE_SIZE'],
+        max_subscribers=app.config['SSE_MAX_STREAMS'],
+    )
+    app.extensions['change_hub'] = change_hub
+
+    @app.after_request
+    def notify_change_hub(response):
+        """Let event streams see a write without waiting for the next poll"""
+        if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            change_hub.notify()
+        return response
+
+    @app.after_request
+    def compress_response(response):
+        """Compress dynamic bodies for clients that accept gzip or brotli"""
+        if (not app.config['COMPRESS_LEVEL']
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES
+                or response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or response.status_code < 200 or response.status_code in (204, 304)):
+            return response
+        response.vary.add('Accept-Encoding')
+        
+        encoding = choose_content_encoding(request.accept_encodings)
+        if response.is_streamed:
+            # Streams are flushed per chunk, which only gzip does here
+            if not request.accept_encodings.quality('gzip'):
+                return response
+            response.response = iter_gzip(response.response, app.config['COMPRESS_LEVEL'])
+            response.headers.pop('Content-Length', None)
+            encoding = 'gzip'
+        else:
+            data = response.get_data()
+            if encoding is None or len(data) < app.config['COMPRESS_MIN_SIZE']:
+                return response
+            level = app.config['COMPRESS_BROTLI_QUALITY'] if encoding == 'br' else app.config['COMPRESS_LEVEL']
+            response.set_data(compress_body(data, encoding, level))
+        response.headers['Content-Encoding'] = encoding
+        # The encoded bytes differ, so a strong validator must not be reused
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    serve_static = app.view_functions['static']
+
+    def static_precompressed(filename):
+        """Serve a .br/.gz variant built by precompress_static when one fits"""
+        accepted = request.accept_encodings
+        source = safe_join(app.static_folder, filename)
+        for encoding, suffix in STATIC_ENCODINGS:
+            if source is None or not accepted.quality(encoding):
+                continue
+            try:
+                fresh = os.path.getmtime(source + suffix) >= os.path.getmtime(source)
+            except OSError:
+                continue
+            if not fresh:
+                continue
+            response = send_from_directory(app.static_folder, filename + suffix,
+                                           mimetype=mimetypes.guess_type(filename)[0])
+            response.headers['Content-Encoding'] = encoding
+            response.vary.add('Accept-Encoding')
+            return response
+        response = serve_static(filename=filename)
+        response.vary.add('Accept-Encoding')
+        return response
+
+    app.view_functions['static'] = static_precompressed
 
     @login_manager.user_loader
     def load_user(user_id):
+        user_id = str(user_id)
+        cached = user_cache.get(user_id)
+        if cached is not None:
+            return cached
         db = get_db()
-        user = db.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
+        user = db.execute('SELECT id, username FROM users WHERE id = ?', (user_id,)).fetchone()
         if user:
-            return User(user['id'], user['username'])
+            user_obj = User(user['id'], user['username'])
+            user_cache.set(user_id, user_obj)
+            return user_obj
         return None
 
     @app.route('/')
@@ -241,11 +2305,27 @@ def create_app(config=None):
     @login_required
     def dashboard():
         db = get_db()
-        checklists = db.execute(
-            'SELECT * FROM checklists WHERE user_id = ?',
-            (current_user.id,)
-        ).fetchall()
-        return render_template('dashboard.html', checklists=checklists)
+        try:
+            limit, after_id = parse_page_args(request.args, app.config['PAGE_MAX_LIMIT'])
+        except ValueError as e:
+            flash(str(e))
+            return redirect(url_for('dashboard'))
+        
+        if limit is None:
+            checklists = db.execute(
+                'SELECT * FROM checklists WHERE user_id = ?',
+                (current_user.id,)
+            ).fetchall()
+            next_cursor = None
+        else:
+            checklists, next_cursor = fetch_page(
+                db,
+                'SELECT * FROM checklists WHERE user_id = ? AND id > ? ORDER BY id LIMIT ?',
+                (current_user.id, after_id),
+                limit
+            )
+        return render_template('dashboard.html', checklists=checklists,
+                               limit=limit, next_cursor=next_cursor)
 
     @app.route('/checklist/<int:id>')
     @login_required
@@ -256,15 +2336,16 @@ def create_app(config=None):
             (id, current_user.id)
         ).fetchone()
         if checklist:
-            # Get all items for this checklist
-            all_items = db.execute(
-                'SELECT * FROM items WHERE checklist_id = ? ORDER BY id',
-                (id,)
-            ).fetchall()
+            # Pending flash messages are part of the page, so render those fresh
+            if session.get('_flashes'):
+                items = cached_checklist(db, checklist).tree
+                return render_template('checklist.html', checklist=checklist, items=items)
             
-            # Organize items hierarchically
-            items = organize_items_hierarchically(all_items)
-            return render_template('checklist.html', checklist=checklist, items=items)
+            html = cached_rendering(
+                db, checklist, 'html',
+                lambda items: render_template('checklist.html', checklist=checklist, items=items).encode('utf-8')
+            )
+            return Response(html, mimetype='text/html')
         return redirect(url_for('dashboard'))
 
     @app.route('/create_checklist', methods=['POST'])
@@ -295,35 +2376,38 @@ def create_app(config=None):
             return redirect(url_for('checklist', id=checklist_id))
         
         # Validate URL if provided
-        if url and not (url.startswith('http://') or url.startswith('https://')):
-            url = 'https://' + url
+        url = normalize_url(url)
             
-        # Convert empty string to None for parent_item_id
+        db = get_db()
+        
+        # Convert empty string to None for parent_item_id; otherwise it must
+        # be an existing item of this checklist
         if parent_item_id == '':
             parent_item_id = None
         elif parent_item_id:
-            parent_item_id = int(parent_item_id)
+            try:
+                parent_item_id = int(parent_item_id)
+            except ValueError:
+                parent_item_id = 0
+            if not fits_sqlite_integer(parent_item_id) or not item_in_checklist(db, checklist_id, parent_item_id):
+                flash('Parent item not found')
+                return redirect(url_for('checklist', id=checklist_id))
             
-        db = get_db()
         db.execute(
             'INSERT INTO items (checklist_id, parent_item_id, content, url, checked) VALUES (?, ?, ?, ?, 0)',
             (checklist_id, parent_item_id, content, url)
         )
+        bump_checklist_version(db, checklist_id)
         db.commit()
+        checklist_changed(checklist_id)
         return redirect(url_for('checklist', id=checklist_id))
 
     @app.route('/toggle_item/<int:item_id>', methods=['POST'])
     @login_required
     def toggle_item(item_id):
-        db = get_db()
-        item = db.execute('SELECT * FROM items WHERE id = ?', (item_id,)).fetchone()
-        if item:
-            new_state = 1 if item['checked'] == 0 else 0
-            db.execute(
-                'UPDATE items SET checked = ? WHERE id = ?',
-                (new_state, item_id)
-            )
-            db.commit()
+        toggled = run_write(toggle_item_checked, item_id, current_user.id)
+        if toggled:
+            checklist_changed(toggled[0])
             return jsonify({'success': True})
         return jsonify({'success': False}), 404
 
@@ -337,24 +2421,14 @@ def create_app(config=None):
             return jsonify({'success': False, 'error': 'Content is required'}), 400
         
         # Validate URL if provided
-        if url and not (url.startswith('http://') or url.startswith('https://')):
-            url = 'https://' + url
+        url = normalize_url(url)
         
         db = get_db()
-        # Verify item exists and belongs to user's checklist
-        item = db.execute('''
-            SELECT i.*, c.user_id 
-            FROM items i 
-            JOIN checklists c ON i.checklist_id = c.id 
-            WHERE i.id = ? AND c.user_id = ?
-        ''', (item_id, current_user.id)).fetchone()
-        
+        # Update the item if it belongs to the user's checklist
+        item = update_owned_item(db, item_id, current_user.id, {'content': content, 'url': url})
         if item:
-            db.execute(
-                'UPDATE items SET content = ?, url = ? WHERE id = ?',
-                (content, url, item_id)
-            )
             db.commit()
+            checklist_changed(item['checklist_id'])
             return jsonify({'success': True})
         return jsonify({'success': False}), 404
 
@@ -362,19 +2436,12 @@ def create_app(config=None):
     @login_required
     def delete_item(item_id):
         db = get_db()
-        # First check if the item exists and belongs to a checklist owned by the current user
-        item = db.execute('''
-            SELECT i.*, c.user_id 
-            FROM items i 
-            JOIN checklists c ON i.checklist_id = c.id 
-            WHERE i.id = ? AND c.user_id = ?
-        ''', (item_id, current_user.id)).fetchone()
-        
-        if item:
-            # Delete all subitems first (cascade deletion)
-            delete_item_and_subitems(db, item_id)
+        # Delete the item together with its whole subtree, if the current user owns it
+        removed = delete_owned_item(db, item_id, current_user.id)
+        if removed:
             db.commit()
-            return jsonify({'success': True})
+            checklist_changed(removed[0])
+            return jsonify({'success': True, 'deleted_items': removed[1]})
         return jsonify({'success': False}), 404
 
     @app.route('/delete_checklist/<int:checklist_id>', methods=['POST'])
@@ -389,11 +2456,12 @@ def create_app(config=None):
         
         if checklist:
             # Delete all items in the checklist first (due to foreign key constraint)
-            db.execute('DELETE FROM items WHERE checklist_id = ?', (checklist_id,))
+            deleted = delete_checklist_items(db, checklist_id)
             # Then delete the checklist itself
             db.execute('DELETE FROM checklists WHERE id = ?', (checklist_id,))
             db.commit()
-            return jsonify({'success': True})
+            checklist_changed(checklist_id)
+            return jsonify({'success': True, 'deleted_items': deleted})
         return jsonify({'success': False}), 404
 
     # ========================================
@@ -403,19 +2471,37 @@ def create_app(config=None):
     @app.route('/api/checklists', methods=['GET'])
     @api_login_required
     def api_get_checklists():
-        """Get all checklists for the current user"""
-        db = get_db()
-        checklists = db.execute(
-            'SELECT id, title FROM checklists WHERE user_id = ? ORDER BY id',
-            (current_user.id,)
-        ).fetchall()
+        """Get all checklists for the current user, optionally one page at a time"""
+        try:
+            limit, after_id = parse_page_args(request.args, app.config['PAGE_MAX_LIMIT'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
+        db = get_db()
+        if limit is None:
+            checklists = db.execute(
+                'SELECT id, title, total_items, checked_items FROM checklists WHERE user_id = ? ORDER BY id',
+                (current_user.id,)
+            ).fetchall()
+            return jsonify({
+                'checklists': checklists
+            })
+        
+        checklists, next_cursor = fetch_page(
+            db,
+            'SELECT id, title, total_items, checked_items FROM checklists '
+            'WHERE user_id = ? AND id > ? ORDER BY id LIMIT ?',
+            (current_user.id, after_id),
+            limit
+        )
         return jsonify({
-            'checklists': [dict(checklist) for checklist in checklists]
+            'checklists': checklists,
+            'next_cursor': next_cursor
         })
     
     @app.route('/api/checklists', methods=['POST'])
     @api_login_required
+    @idempotent
     def api_create_checklist():
         """Create a new checklist"""
         data = request.get_json() or {}
@@ -436,13 +2522,33 @@ def create_app(config=None):
         return jsonify({
             'id': cursor.lastrowid,
             'title': title,
-            'user_id': current_user.id
+            'user_id': current_user.id,
+            'version': 1
         }), 201
     
     @app.route('/api/checklists/<int:checklist_id>', methods=['GET'])
     @api_login_required
     def api_get_checklist(checklist_id):
-        """Get a specific checklist with all its items"""
+        """Get a specific checklist with all its items.
+
+        format=ndjson streams the checklist as its first line followed by one
+        flat item per line. format=compact encodes each item as a list in the
+        order given by the response's fields. fields=a,b trims every item to
+        those columns. root and depth load only part of the tree, see
+        fetch_item_subtree.
+        """
+        try:
+            fmt = requested_format(('json', 'ndjson', 'compact'))
+            root_id, depth = parse_subtree_args(request.args)
+            fields = parse_item_fields(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        partial = root_id is not None or depth is not None
+        if fmt == 'ndjson' and partial:
+            return jsonify({'error': 'Partial trees cannot be streamed'}), 400
+        compact = fmt == 'compact'
+        
         db = get_db()
         
         # Get checklist (verify ownership)
@@ -454,26 +2560,66 @@ def create_app(config=None):
         if not checklist:
             return jsonify({'error': 'Checklist not found'}), 404
         
-        # Get all items for this checklist
-        all_items = db.execute(
-            'SELECT * FROM items WHERE checklist_id = ? ORDER BY id',
-            (checklist_id,)
-        ).fetchall()
+        # Answer revalidation from the version alone, without loading items
+        etag = checklist_etag(checklist_id, checklist['version'], format_variant(fmt, request.query_string))
+        if request.if_none_match.contains_weak(etag):
+            return not_modified(etag)
         
-        # Organize items hierarchically
-        items = organize_items_hierarchically(all_items)
+        header = {'id': checklist['id'], 'title': checklist['title'],
+                  'user_id': checklist['user_id'], 'version': checklist['version']}
+        if compact:
+            header['fields'] = list(item_output_fields(fields, compact=True)) + ['subitems']
         
-        return jsonify({
-            'id': checklist['id'],
-            'title': checklist['title'],
-            'user_id': checklist['user_id'],
-            'items': [dict(item) for item in items]
-        })
+        if fmt == 'ndjson':
+            cursor = db.execute(
+                f'SELECT {item_select_list(fields)} FROM items WHERE checklist_id = ? ORDER BY id',
+                (checklist_id,)
+            )
+            response = Response(stream_with_context(iter_ndjson_rows(cursor, first=header)),
+                                mimetype=NDJSON_MIMETYPE)
+            return with_etag(response, etag)
+        
+        if partial:
+            if root_id is not None and not item_in_checklist(db, checklist_id, root_id):
+                return jsonify({'error': 'Item not found'}), 404
+            if compact:
+                header['fields'][-1:-1] = ['child_count', 'has_children']
+            return with_etag(jsonify({
+                **header,
+                'root': root_id,
+                'depth': depth,
+                'items': fetch_item_subtree(db, checklist_id, root_id, depth, fields, compact)
+            }), etag)
+        
+        if fields is not None:
+            items = fetch_item_tree(db, checklist_id, fields, compact)
+            return with_etag(jsonify({**header, 'items': items}), etag)
+        
+        if compact:
+            body = cached_rendering(db, checklist, 'checklist_compact', lambda items: app.json.dumpb({
+                **header,
+                'items': compact_item_tree(items)
+            }))
+            return with_etag(app.response_class(body, mimetype=app.json.mimetype), etag)
+        
+        if request.query_string:
+            items = cached_checklist(db, checklist).tree
+            return with_etag(jsonify({**header, 'items': items}), etag)
+        
+        body = cached_rendering(db, checklist, 'checklist_json', lambda items: app.json.dumpb({
+            **header,
+            'items': items
+        }))
+        return with_etag(app.response_class(body, mimetype=app.json.mimetype), etag)
     
     @app.route('/api/checklists/<int:checklist_id>', methods=['PUT'])
     @api_login_required
     def api_update_checklist(checklist_id):
-        """Update a checklist (currently just title)"""
+        """Update a checklist (currently just title).
+
+        A conditional update checks the checklist's version, which every item
+        write bumps too: If-Match covers the whole checklist, not the title.
+        """
         data = request.get_json() or {}
         if 'title' not in data:
             return jsonify({'error': 'Title is required'}), 400
@@ -482,24 +2628,39 @@ def create_app(config=None):
         if not title:
             return jsonify({'error': 'Title cannot be empty'}), 400
         
+        try:
+            version = expected_version(request.if_match, data, f'checklist-{checklist_id}')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         db = get_db()
         
-        # Verify ownership and update
-        result = db.execute(
-            'UPDATE checklists SET title = ? WHERE id = ? AND user_id = ?',
-            (title, checklist_id, current_user.id)
-        )
+        # Verify ownership (and the expected version) and update
+        updated = db.execute(
+            'UPDATE checklists SET title = ?, version = version + 1 '
+            'WHERE id = ? AND user_id = ? AND (? IS NULL OR version = ?) RETURNING version',
+            (title, checklist_id, current_user.id, version, version)
+        ).fetchall()
         
-        if result.rowcount == 0:
-            return jsonify({'error': 'Checklist not found'}), 404
+        if not updated:
+            return checklist_conflict(db, checklist_id)
         
         db.commit()
-        return jsonify({'id': checklist_id, 'title': title})
+        checklist_changed(checklist_id)
+        response = jsonify({'id': checklist_id, 'title': title, 'version': updated[0]['version']})
+        response.set_etag(checklist_etag(checklist_id, updated[0]['version']))
+        return response
     
     @app.route('/api/checklists/<int:checklist_id>', methods=['DELETE'])
     @api_login_required
     def api_delete_checklist(checklist_id):
         """Delete a checklist and all its items"""
+        try:
+            version = expected_version(request.if_match, request.get_json(silent=True),
+                                       f'checklist-{checklist_id}')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         db = get_db()
         
         # Check if the checklist belongs to the current user
@@ -510,20 +2671,46 @@ def create_app(config=None):
         
         if not checklist:
             return jsonify({'error': 'Checklist not found'}), 404
+        if version is not None and checklist['version'] != version:
+            return checklist_conflict(db, checklist_id)
         
         # Delete all items in the checklist first (due to foreign key constraint)
-        db.execute('DELETE FROM items WHERE checklist_id = ?', (checklist_id,))
+        deleted = delete_checklist_items(db, checklist_id)
         # Then delete the checklist itself
         db.execute('DELETE FROM checklists WHERE id = ?', (checklist_id,))
         db.commit()
+        checklist_changed(checklist_id)
         
-        return jsonify({'message': 'Checklist deleted successfully'})
+        return jsonify({'message': 'Checklist deleted successfully', 'deleted_items': deleted})
     
     # Item-specific API routes
     @app.route('/api/checklists/<int:checklist_id>/items', methods=['GET'])
     @api_login_required
     def api_get_items(checklist_id):
-        """Get all items in a checklist"""
+        """Get all items in a checklist.
+
+        With limit/cursor the items come back as a flat page ordered by id,
+        each carrying its parent_item_id, instead of as a tree. format=ndjson
+        streams every item as the same flat rows, one per line. fields and
+        format=compact work as for api_get_checklist; compact pages are flat
+        lists of rows. root and depth load only part of the tree, see
+        fetch_item_subtree.
+        """
+        try:
+            limit, after_id = parse_page_args(request.args, app.config['PAGE_MAX_LIMIT'])
+            fmt = requested_format(('json', 'ndjson', 'compact'))
+            root_id, depth = parse_subtree_args(request.args)
+            fields = parse_item_fields(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        partial = root_id is not None or depth is not None
+        if fmt == 'ndjson' and limit is not None:
+            return jsonify({'error': 'Streamed responses cannot be paginated'}), 400
+        if partial and (fmt == 'ndjson' or limit is not None):
+            return jsonify({'error': 'Partial trees cannot be streamed or paginated'}), 400
+        compact = fmt == 'compact'
+        
         db = get_db()
         
         # Verify checklist ownership
@@ -535,22 +2722,72 @@ def create_app(config=None):
         if not checklist:
             return jsonify({'error': 'Checklist not found'}), 404
         
-        # Get all items for this checklist
-        all_items = db.execute(
-            'SELECT * FROM items WHERE checklist_id = ? ORDER BY id',
-            (checklist_id,)
-        ).fetchall()
-        
-        # Organize items hierarchically
-        items = organize_items_hierarchically(all_items)
+        etag = checklist_etag(checklist_id, checklist['version'],
+                              format_variant(fmt, b'items?' + request.query_string))
+        if request.if_none_match.contains_weak(etag):
+            return not_modified(etag)
         
-        return jsonify({
-            'checklist_id': checklist_id,
-            'items': [dict(item) for item in items]
-        })
+        if fmt == 'ndjson':
+            cursor = db.execute(
+                f'SELECT {item_select_list(fields)} FROM items WHERE checklist_id = ? ORDER BY id',
+                (checklist_id,)
+            )
+            response = Response(stream_with_context(iter_ndjson_rows(cursor)), mimetype=NDJSON_MIMETYPE)
+            return with_etag(response, etag)
+        
+        if limit is not None:
+            items, next_cursor = fetch_page(
+                db,
+                f'SELECT {item_select_list(fields)} FROM items '
+                'WHERE checklist_id = ? AND id > ? ORDER BY id LIMIT ?',
+                (checklist_id, after_id),
+                limit
+            )
+            page = {'checklist_id': checklist_id}
+            if compact:
+                page['fields'] = list(fields or ITEM_COLUMNS)
+                page['items'] = [list(item) for item in items]
+            else:
+                page['items'] = items
+            page['next_cursor'] = next_cursor
+            return with_etag(jsonify(page), etag)
+        
+        header = {'checklist_id': checklist_id}
+        if compact:
+            header['fields'] = list(item_output_fields(fields, compact=True)) + ['subitems']
+        
+        if partial:
+            if root_id is not None and not item_in_checklist(db, checklist_id, root_id):
+                return jsonify({'error': 'Item not found'}), 404
+            if compact:
+                header['fields'][-1:-1] = ['child_count', 'has_children']
+            return with_etag(jsonify({
+                **header,
+                'root': root_id,
+                'depth': depth,
+                'items': fetch_item_subtree(db, checklist_id, root_id, depth, fields, compact)
+            }), etag)
+        
+        if fields is not None:
+            items = fetch_item_tree(db, checklist_id, fields, compact)
+            return with_etag(jsonify({**header, 'items': items}), etag)
+        
+        if compact:
+            body = cached_rendering(db, checklist, 'items_compact', lambda items: app.json.dumpb({
+                **header,
+                'items': compact_item_tree(items)
+            }))
+            return with_etag(app.response_class(body, mimetype=app.json.mimetype), etag)
+        
+        body = cached_rendering(db, checklist, 'items_json', lambda items: app.json.dumpb({
+            **header,
+            'items': items
+        }))
+        return with_etag(app.response_class(body, mimetype=app.json.mimetype), etag)
     
     @app.route('/api/checklists/<int:checklist_id>/items', methods=['POST'])
     @api_login_required
+    @idempotent
     def api_create_item(checklist_id):
         """Create a new item in a checklist"""
         data = request.get_json() or {}
@@ -566,8 +2803,7 @@ def create_app(config=None):
         checked = data.get('checked', False)
         
         # Validate URL if provided
-        if url and not (url.startswith('http://') or url.startswith('https://')):
-            url = 'https://' + url
+        url = normalize_url(url)
         
         # Validate parent_item_id if provided
         if parent_item_id is not None:
@@ -601,7 +2837,9 @@ def create_app(config=None):
             'INSERT INTO items (checklist_id, parent_item_id, content, url, checked) VALUES (?, ?, ?, ?, ?)',
             (checklist_id, parent_item_id, content, url, 1 if checked else 0)
         )
+        bump_checklist_version(db, checklist_id)
         db.commit()
+        checklist_changed(checklist_id)
         
         return jsonify({
             'id': cursor.lastrowid,
@@ -609,21 +2847,176 @@ def create_app(config=None):
             'parent_item_id': parent_item_id,
             'content': content,
             'url': url,
-            'checked': checked
+            'checked': checked,
+            'version': 1
+        }), 201
+    
+    @app.route('/api/checklists/<int:checklist_id>/items:batch', methods=['POST'])
+    @api_login_required
+    @idempotent
+    def api_create_items_batch(checklist_id):
+        """Create many items, optionally nested, in a single transaction"""
+        data = request.get_json(silent=True) or {}
+        if 'items' not in data:
+            return jsonify({'error': 'Items are required'}), 400
+        
+        try:
+            rows = flatten_item_batch(data['items'])
+        except BatchError as e:
+            return jsonify({'error': str(e), 'index': e.index}), 400
+        
+        if not rows:
+            return jsonify({'error': 'Items cannot be empty'}), 400
+        if len(rows) > app.config['BATCH_MAX_ITEMS']:
+            return jsonify({'error': f"At most {app.config['BATCH_MAX_ITEMS']} items per batch"}), 400
+        
+        db = get_db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            # Verify checklist ownership once for the whole batch
+            checklist = db.execute(
+                'SELECT id FROM checklists WHERE id = ? AND user_id = ?',
+                (checklist_id, current_user.id)
+            ).fetchone()
+            if not checklist:
+                db.rollback()
+                return jsonify({'error': 'Checklist not found'}), 404
+            
+            # Existing parents must all live in this checklist
+            parent_ids = {row['parent_item_id'] for row in rows if row['parent_item_id'] is not None}
+            if parent_ids:
+                placeholders = ', '.join('?' * len(parent_ids))
+                found = db.execute(
+                    f'SELECT COUNT(*) FROM items WHERE checklist_id = ? AND id IN ({placeholders})',
+                    (checklist_id, *parent_ids)
+                ).fetchone()[0]
+                if found != len(parent_ids):
+                    db.rollback()
+                    return jsonify({'error': 'Parent item not found'}), 404
+            
+            ids = insert_item_batch(db, checklist_id, rows)
+            bump_checklist_version(db, checklist_id)
+            db.commit()
+            checklist_changed(checklist_id)
+        except sqlite3.Error:
+            db.rollback()
+            raise
+        
+        return jsonify({
+            'checklist_id': checklist_id,
+            'ids': ids,
+            'temp_ids': {row['temp_id']: item_id for row, item_id in zip(rows, ids)
+                         if row['temp_id'] is not None}
         }), 201
     
+    @app.route('/api/checklists/<int:checklist_id>/items:mutate', methods=['POST'])
+    @api_login_required
+    def api_mutate_items_batch(checklist_id):
+        """Apply toggle, set_checked, update and delete operations atomically"""
+        data = request.get_json(silent=True) or {}
+        if 'operations' not in data:
+            return jsonify({'error': 'Operations are required'}), 400
+        
+        try:
+            operations = validate_item_operations(data['operations'])
+        except BatchError as e:
+            return jsonify({'error': str(e), 'index': e.index}), 400
+        
+        if not operations:
+            return jsonify({'error': 'Operations cannot be empty'}), 400
+        if len(operations) > app.config['BATCH_MAX_ITEMS']:
+            return jsonify({'error': f"At most {app.config['BATCH_MAX_ITEMS']} operations per batch"}), 400
+        
+        db = get_db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            # Verify checklist ownership once for the whole set
+            checklist = db.execute(
+                'SELECT id FROM checklists WHERE id = ? AND user_id = ?',
+                (checklist_id, current_user.id)
+            ).fetchone()
+            if not checklist:
+                db.rollback()
+                return jsonify({'error': 'Checklist not found'}), 404
+            
+            # Load the checked state and version of every referenced item in one query
+            item_ids = sorted({operation['id'] for operation in operations})
+            placeholders = ', '.join('?' * len(item_ids))
+            checked, versions = {}, {}
+            for item_id, item_checked, item_version in db.execute(
+                f'SELECT id, checked, version FROM items WHERE checklist_id = ? AND id IN ({placeholders})',
+                (checklist_id, *item_ids)
+            ):
+                checked[item_id] = item_checked
+                versions[item_id] = item_version
+            
+            results = []
+            for index, operation in enumerate(operations):
+                op, item_id = operation['op'], operation['id']
+                if item_id not in checked:
+                    # Missing, in another checklist, or removed earlier in this batch
+                    db.rollback()
+                    return jsonify({'error': 'Item not found', 'index': index, 'id': item_id}), 404
+                if operation.get('version', versions[item_id]) != versions[item_id]:
+                    current = dict(db.execute('SELECT * FROM items WHERE id = ?', (item_id,)).fetchone())
+                    db.rollback()
+                    return jsonify({'error': 'Version mismatch', 'index': index, 'id': item_id,
+                                    'current': current}), 412
+                
+                result = {'op': op, 'id': item_id}
+                if op in ('toggle', 'set_checked'):
+                    new_state = 1 - checked[item_id] if op == 'toggle' else operation['checked']
+                    db.execute('UPDATE items SET checked = ?, version = version + 1 WHERE id = ?',
+                               (new_state, item_id))
+                    checked[item_id] = new_state
+                    result['checked'] = bool(new_state)
+                elif op == 'update':
+                    fields = [field for field in ('content', 'url') if field in operation]
+                    db.execute(
+                        f'UPDATE items SET {"".join(field + " = ?, " for field in fields)}version = version + 1 '
+                        'WHERE id = ?',
+                        [operation[field] for field in fields] + [item_id]
+                    )
+                    result.update((field, operation[field]) for field in fields)
+                else:
+                    deleted_ids = delete_item_and_subitems(db, item_id)
+                    result['deleted_items'] = len(deleted_ids)
+                    # Forget every item that went with the subtree
+                    for deleted_id in deleted_ids:
+                        checked.pop(deleted_id, None)
+                        versions.pop(deleted_id, None)
+                if op != 'delete':
+                    versions[item_id] += 1
+                    result['version'] = versions[item_id]
+                results.append(result)
+            
+            bump_checklist_version(db, checklist_id)
+            db.commit()
+            checklist_changed(checklist_id)
+        except sqlite3.Error:
+            db.rollback()
+            raise
+        
+        return jsonify({'checklist_id': checklist_id, 'results': results})
+    
     @app.route('/api/checklists/<int:checklist_id>/items/<int:item_id>', methods=['GET'])
     @api_login_required
     def api_get_item(checklist_id, item_id):
-        """Get a specific item"""
+        """Get a specific item and its direct subitems, optionally trimmed to fields"""
+        try:
+            fields = parse_item_fields(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         db = get_db()
+        columns = item_select_list(fields)
         
         # Verify item exists and belongs to user's checklist
-        item = db.execute('''
-            SELECT i.*, c.user_id 
-            FROM items i 
-            JOIN checklists c ON i.checklist_id = c.id 
-            WHERE i.id = ? AND i.checklist_id = ? AND c.user_id = ?
+        item = db.execute(f'''
+            SELECT {columns}
+            FROM items
+            JOIN checklists c ON items.checklist_id = c.id
+            WHERE items.id = ? AND items.checklist_id = ? AND c.user_id = ?
         ''', (item_id, checklist_id, current_user.id)).fetchone()
         
         if not item:
@@ -631,14 +3024,17 @@ def create_app(config=None):
         
         # Get subitems if any
         subitems = db.execute(
-            'SELECT * FROM items WHERE parent_item_id = ? ORDER BY id',
+            f'SELECT {columns} FROM items WHERE parent_item_id = ? ORDER BY id',
             (item_id,)
         ).fetchall()
         
         item_dict = dict(item)
-        item_dict['subitems'] = [dict(subitem) for subitem in subitems]
+        item_dict['subitems'] = subitems
         
-        return jsonify(item_dict)
+        response = jsonify(item_dict)
+        if 'version' in item_dict:
+            response.set_etag(item_etag(item_id, item_dict['version']))
+        return response
     
     @app.route('/api/checklists/<int:checklist_id>/items/<int:item_id>', methods=['PUT'])
     @api_login_required
@@ -648,129 +3044,320 @@ def create_app(config=None):
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
-        db = get_db()
-        
-        # Verify item exists and belongs to user's checklist
-        item = db.execute('''
-            SELECT i.*, c.user_id 
-            FROM items i 
-            JOIN checklists c ON i.checklist_id = c.id 
-            WHERE i.id = ? AND i.checklist_id = ? AND c.user_id = ?
-        ''', (item_id, checklist_id, current_user.id)).fetchone()
-        
-        if not item:
-            return jsonify({'error': 'Item not found'}), 404
-        
         # Prepare update fields
-        updates = []
-        params = []
+        changes = {}
         
         if 'content' in data:
             content = data['content'].strip()
             if not content:
                 return jsonify({'error': 'Content cannot be empty'}), 400
-            updates.append('content = ?')
-            params.append(content)
+            changes['content'] = content
         
         if 'url' in data:
-            url = data['url'].strip()
-            if url and not (url.startswith('http://') or url.startswith('https://')):
-                url = 'https://' + url
-            updates.append('url = ?')
-            params.append(url)
+            changes['url'] = normalize_url(data['url'].strip())
         
         if 'checked' in data:
-            updates.append('checked = ?')
-            params.append(1 if data['checked'] else 0)
+            changes['checked'] = 1 if data['checked'] else 0
         
-        if not updates:
+        if not changes:
             return jsonify({'error': 'No valid fields to update'}), 400
         
-        # Execute update
-        params.append(item_id)
-        db.execute(
-            f'UPDATE items SET {", ".join(updates)} WHERE id = ?',
-            params
-        )
-        db.commit()
+        try:
+            version = expected_version(request.if_match, data, f'item-{item_id}')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Return updated item
-        updated_item = db.execute(
-            'SELECT * FROM items WHERE id = ?',
-            (item_id,)
-        ).fetchone()
+        # Ownership and version check, update and result in one statement
+        db = get_db()
+        updated_item = update_owned_item(db, item_id, current_user.id, changes, checklist_id, version)
+        if updated_item is None:
+            return item_conflict(db, checklist_id, item_id)
+        db.commit()
+        checklist_changed(checklist_id)
         
-        return jsonify(dict(updated_item))
+        response = jsonify(updated_item)
+        response.set_etag(item_etag(item_id, updated_item['version']))
+        return response
     
     @app.route('/api/checklists/<int:checklist_id>/items/<int:item_id>', methods=['DELETE'])
     @api_login_required
     def api_delete_item(checklist_id, item_id):
         """Delete an item and all its subitems"""
-        db = get_db()
-        
-        # Verify item exists and belongs to user's checklist
-        item = db.execute('''
-            SELECT i.*, c.user_id 
-            FROM items i 
-            JOIN checklists c ON i.checklist_id = c.id 
-            WHERE i.id = ? AND i.checklist_id = ? AND c.user_id = ?
-        ''', (item_id, checklist_id, current_user.id)).fetchone()
+        try:
+            version = expected_version(request.if_match, request.get_json(silent=True), f'item-{item_id}')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        if not item:
-            return jsonify({'error': 'Item not found'}), 404
+        db = get_db()
         
-        # Delete all subitems first (cascade deletion)
-        delete_item_and_subitems(db, item_id)
+        # Ownership and version check and subtree delete in one statement
+        removed = delete_owned_item(db, item_id, current_user.id, checklist_id, version)
+        if removed is None:
+            return item_conflict(db, checklist_id, item_id)
+        deleted = removed[1]
         db.commit()
+        checklist_changed(checklist_id)
         
-        return jsonify({'message': 'Item deleted successfully'})
+        return jsonify({'message': 'Item deleted successfully', 'deleted_items': deleted})
     
     # Additional API utility endpoints
     @app.route('/api/checklists/<int:checklist_id>/items/<int:item_id>/toggle', methods=['POST'])
     @api_login_required
     def api_toggle_item(checklist_id, item_id):
         """Toggle an item's checked status"""
-        db = get_db()
-        
-        # Verify item exists and belongs to user's checklist
-        item = db.execute('''
-            SELECT i.*, c.user_id 
-            FROM items i 
-            JOIN checklists c ON i.checklist_id = c.id 
-            WHERE i.id = ? AND i.checklist_id = ? AND c.user_id = ?
-        ''', (item_id, checklist_id, current_user.id)).fetchone()
+        try:
+            version = expected_version(request.if_match, request.get_json(silent=True), f'item-{item_id}')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        if not item:
-            return jsonify({'error': 'Item not found'}), 404
+        toggled = run_write(toggle_item_checked, item_id, current_user.id, checklist_id, version)
+        if not toggled:
+            return item_conflict(get_db(), checklist_id, item_id)
         
-        new_state = 1 if item['checked'] == 0 else 0
-        db.execute(
-            'UPDATE items SET checked = ? WHERE id = ?',
-            (new_state, item_id)
-        )
-        db.commit()
+        _, new_state, new_version = toggled
+        checklist_changed(checklist_id)
         
         return jsonify({
             'id': item_id,
             'checked': bool(new_state),
+            'version': new_version,
             'message': f'Item {"checked" if new_state else "unchecked"}'
         })
     
+    @app.route('/api/sync', methods=['GET'])
+    @api_login_required
+    def api_sync():
+        """Return the current user's changes since a sync cursor.
+
+        Without since, only the current cursor is returned: take it before
+        loading checklists, then poll with since=<cursor>.
+        """
+        db = get_db()
+        since = request.args.get('since')
+        if since is None:
+            return jsonify({'cursor': encode_page_cursor(latest_change_id(db, current_user.id))})
+        try:
+            after_id = decode_page_cursor(since)
+            limit, _ = parse_page_args(request.args, app.config['PAGE_MAX_LIMIT'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        try:
+            payload, last_id = fetch_changes(db, current_user.id, after_id,
+                                             limit or app.config['PAGE_MAX_LIMIT'])
+        except CursorExpired:
+            return jsonify({'error': 'Cursor expired, sync from scratch'}), 410
+        payload['cursor'] = encode_page_cursor(last_id)
+        return jsonify(payload)
+    
+    @app.route('/api/checklists/<int:checklist_id>/events', methods=['GET'])
+    @api_login_required
+    def api_checklist_events(checklist_id):
+        """Stream a checklist's item and title changes as Server-Sent Events.
+
+        Each event id is a change log id; a reconnecting client sends it back
+        in Last-Event-ID and first receives what it missed. The stream holds
+        no database connection while it waits.
+        """
+        last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+        try:
+            last_event_id = int(last_event_id) if last_event_id else None
+        except ValueError:
+            return jsonify({'error': 'Invalid Last-Event-ID'}), 400
+        if last_event_id is not None and not fits_sqlite_integer(last_event_id):
+            return jsonify({'error': 'Invalid Last-Event-ID'}), 400
+        
+        db = get_db()
+        checklist = db.execute(
+            'SELECT id FROM checklists WHERE id = ? AND user_id = ?',
+            (checklist_id, current_user.id)
+        ).fetchone()
+        if not checklist:
+            return jsonify({'error': 'Checklist not found'}), 404
+        
+        # Subscribe before replaying so nothing falls between the two. Each
+        # stream holds a server thread, so refuse rather than starve the pool.
+        try:
+            subscription = change_hub.subscribe(checklist_id, db)
+        except TooManySubscribers:
+            response = jsonify({'error': 'Too many open event streams'})
+            response.status_code = 503
+            response.headers['Retry-After'] = '5'
+            return response
+        replay, reset_to = [], None
+        if last_event_id is not None:
+            compacted = db.execute('SELECT through_id FROM changes_compacted').fetchone()
+            if compacted and last_event_id < compacted[0]:
+                reset_to = db.execute('SELECT COALESCE(MAX(id), 0) FROM changes').fetchone()[0]
+            else:
+                rows = db.execute(
+                    CHANGE_EVENTS_QUERY + 'WHERE changes.checklist_id = ? AND changes.id > ? ORDER BY changes.id',
+                    (checklist_id, last_event_id)
+                ).fetchall()
+                replay = [event for event in map(change_event, rows) if event is not None]
+        close_db()  # Hand the connection back before the long-lived stream starts
+        
+        heartbeat = app.config['SSE_HEARTBEAT']
+        dumps = app.json.dumps
+        
+        def stream():
+            try:
+                yield 'retry: 3000\n\n'
+                if reset_to is not None:
+                    # Too far behind: the client must reload, then resumes from here
+                    yield format_sse(reset_to, 'reset', '{}')
+                    return
+                last_sent = last_event_id or 0
+                for change_id, event, data in replay:
+                    yield format_sse(change_id, event, dumps(data))
+                    last_sent = change_id
+                while True:
+                    if subscription.overflowed:
+                        yield format_sse(last_sent, 'reset', '{}')
+                        return
+                    try:
+                        change_id, event, data = subscription.queue.get(timeout=heartbeat)
+                    except queue.Empty:
+                        yield ': heartbeat\n\n'
+                        continue
+                    if change_id <= last_sent:
+                        continue  # Already sent during replay
+                    yield format_sse(change_id, event, dumps(data))
+                    last_sent = change_id
+            finally:
+                change_hub.unsubscribe(subscription)
+        
+        response = Response(stream(), mimetype='text/event-stream')
+        # A stream closed before its first chunk never runs the finally above
+        response.call_on_close(lambda: change_hub.unsubscribe(subscription))
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+    
+    @app.route('/api/stats', methods=['GET'])
+    @api_login_required
+    def api_stats():
+        """Report runtime counters for the connection pool and caches.
+
+        The counters are process-wide and reflect every user's activity, so
+        only the operator accounts listed in STATS_USERS may read them.
+        """
+        if current_user.username not in app.config['STATS_USERS']:
+            return jsonify({'error': 'Not found'}), 404
+        return jsonify({
+            'db_pool': pool.stats(),
+            'user_cache': user_cache.stats(),
+            'tree_cache': tree_cache.stats(),
+            'change_hub': change_hub.stats(),
+            'write_queue': write_queue.stats() if write_queue is not None else None,
+            'idempotency': idempotency_store.stats() if idempotency_store is not None else None,
+        })
+    
     @app.cli.command('init-db')
     def init_db_command():
-        """Clear existing data and create new tables."""
+        """Create missing tables and apply pending schema migrations."""
         init_db(app_instance=app)
         print('Initialized the database.')
     
+    @app.cli.command('recompute-counters')
+    def recompute_counters_command():
+        """Recount the per-checklist item counters from the items table."""
+        db = get_db_connection(app.config['DATABASE'], app.config['DATABASE_PRAGMAS'])
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            repaired = recompute_checklist_counters(db)
+            db.commit()
+        finally:
+            db.close()
+        print(f'Repaired counters on {repaired} checklist(s).')
+    
+    @app.cli.command('compact-changes')
+    def compact_changes_command():
+        """Drop superseded and expired entries from the sync change log."""
+        db = get_db_connection(app.config['DATABASE'], app.config['DATABASE_PRAGMAS'])
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            removed = compact_changes(db, app.config['SYNC_RETENTION'])
+            db.commit()
+        finally:
+            db.close()
+        print(f'Removed {removed} change log entries.')
+
+    def bulk_progress(verb):
+        """Return report(counts, final=False), printing throughput to stderr at most once a second"""
+        started = time.monotonic()
+        next_report = [started + 1]
+
+        def report(counts, final=False):
+            now = time.monotonic()
+            if not final and now < next_report[0]:
+                return
+            next_report[0] = now + 1
+            elapsed = max(now - started, 1e-6)
+            click.echo(f"{verb} {counts['users']} user(s), {counts['checklists']} checklist(s), "
+                       f"{counts['items']} item(s) in {elapsed:.1f}s ({counts['items'] / elapsed:,.0f} items/s)",
+                       err=True)
+        return report
+
+    @app.cli.command('export')
+    @click.argument('output', type=click.File('wb'), default='-')
+    @click.option('--format', 'fmt', type=click.Choice(EXPORT_FORMATS), default='ndjson', show_default=True)
+    @click.option('--user', 'username', help="Only export this user's checklists.")
+    def export_command(output, fmt, username):
+        """Stream users, checklists and items to OUTPUT (default stdout)."""
+        report = bulk_progress('Exported')
+        counts = {'users': 0, 'checklists': 0, 'items': 0}
+
+        def counted(records):
+            for record in records:
+                if record['type'] != 'header':
+                    counts[record['type'] + 's'] += 1
+                    if counts['items'] % 1000 == 0:
+                        report(counts)
+                yield record
+
+        db = get_db_connection(app.config['DATABASE'], app.config['DATABASE_PRAGMAS'])
+        try:
+            # One read transaction, so the export is a consistent snapshot
+            db.execute('BEGIN')
+            write_export(counted(iter_export_records(db, username)), output, fmt, app.json.dumpb)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        finally:
+            db.rollback()
+            db.close()
+        report(counts, final=True)
+
+    @app.cli.command('import')
+    @click.argument('input_file', metavar='INPUT', type=click.File('r', encoding='utf-8'), default='-')
+    @click.option('--user', 'username', help='Assign every imported checklist to this existing user.')
+    @click.option('--chunk-size', type=click.IntRange(1), default=5000, show_default=True,
+                  help='Items written per transaction.')
+    def import_command(input_file, username, chunk_size):
+        """Add the checklists of an NDJSON or JSON export in INPUT (default stdin)."""
+        report = bulk_progress('Imported')
+        db = get_db_connection(app.config['DATABASE'], app.config['DATABASE_PRAGMAS'])
+        try:
+            user_id = None
+            if username is not None:
+                user = db.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()
+                if user is None:
+                    raise click.ClickException(f'Unknown user {username!r}')
+                user_id = user['id']
+            counts = import_records(db, read_export_records(input_file, app.json.loads),
+                                    user_id=user_id, chunk_size=chunk_size, progress=report)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        finally:
+            db.close()
+        report(counts, final=True)
+
     # Ensure database is initialized on app startup
     with app.app_context():
         ensure_db_initialized(app_instance=app)
     
     return app
 
-# Create a global app instance for development
-app = create_app()
-
 def main():
     """Entry point for the command line script"""
     app = create_app()
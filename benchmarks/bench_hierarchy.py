@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Hierarchy builder benchmark for Smart Checklist App
+
+Compares the original two-pass organize_items_hierarchically against the
+single-pass build_item_tree (dict and compact output) on checklists of
+1k, 10k and 100k items. Rows come from a real SQLite query so they are
+sqlite3.Row objects, exactly as the routes see them.
+
+Usage:
+    python benchmarks/bench_hierarchy.py [--sizes 1000 10000 100000] [--repeat N]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import build_item_tree
+
+def legacy_organize_items_hierarchically(all_items):
+    """The two-pass builder this benchmark measures against"""
+    items_dict = {}
+    root_items = []
+
+    for item in all_items:
+        item_dict = dict(item)
+        item_dict['subitems'] = []
+        items_dict[item['id']] = item_dict
+
+    for item in all_items:
+        if item['parent_item_id'] is None:
+            root_items.append(items_dict[item['id']])
+        else:
+            if item['parent_item_id'] in items_dict:
+                items_dict[item['parent_item_id']]['subitems'].append(items_dict[item['id']])
+
+    return root_items
+
+def make_rows(count, seed=42):
+    """Return count item rows forming a random forest, read back via SQLite"""
+    rng = random.Random(seed)
+    db = sqlite3.connect(':memory:')
+    db.row_factory = sqlite3.Row
+    db.execute('''
+        CREATE TABLE items (id INTEGER PRIMARY KEY, checklist_id INTEGER NOT NULL,
+                            parent_item_id INTEGER, content TEXT NOT NULL, url TEXT,
+                            checked INTEGER NOT NULL DEFAULT 0, version INTEGER NOT NULL DEFAULT 1)
+    ''')
+    rows = []
+    for item_id in range(1, count + 1):
+        # A fifth of the items are roots, the rest hang off an earlier item
+        parent = None if item_id == 1 or rng.random() < 0.2 else rng.randint(1, item_id - 1)
+        rows.append((item_id, 1, parent, f'Item {item_id}', '', rng.randint(0, 1), 1))
+    db.executemany('INSERT INTO items VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+    result = db.execute('SELECT * FROM items WHERE checklist_id = 1 ORDER BY id').fetchall()
+    db.close()
+    return result
+
+def best_of(func, rows, repeat):
+    """Best wall time in milliseconds over repeat runs"""
+    return min(timeit.repeat(lambda: func(rows), number=1, repeat=repeat)) * 1000
+
+def main():
+    """Run the hierarchy benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement')
+    args = parser.parse_args()
+
+    print("Smart Checklist Hierarchy Benchmark")
+    print("=" * 40)
+    print(f"{'items':>8}  {'legacy':>10}  {'one-pass':>10}  {'compact':>10}  {'speedup':>8}")
+
+    for size in args.sizes:
+        rows = make_rows(size)
+        legacy = best_of(legacy_organize_items_hierarchically, rows, args.repeat)
+        single = best_of(lambda r: build_item_tree(r), rows, args.repeat)
+        compact = best_of(lambda r: build_item_tree(r, compact=True), rows, args.repeat)
+        print(f"{size:>8}  {legacy:>8.2f}ms  {single:>8.2f}ms  {compact:>8.2f}ms  "
+              f"{legacy / single:>7.2f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+JSON serialization benchmark for Smart Checklist App
+
+Serializes a 10k-item checklist with FastJSONProvider using the stdlib
+encoder and, when it is installed, orjson. Two payloads are measured: the
+nested item tree the checklist endpoints return, and the flat page of
+sqlite3.Row objects a paginated listing hands to jsonify, comparing explicit
+dict(row) copies against passing the rows through (the provider converts
+each row as it meets it, so expect about the same time).
+
+Usage:
+    python benchmarks/bench_json.py [--items N] [--repeat N]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import FastJSONProvider, build_item_tree, orjson
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_hierarchy import make_rows
+
+def best_of(func, repeat):
+    """Best wall time in milliseconds over repeat runs"""
+    return min(timeit.repeat(func, number=1, repeat=repeat)) * 1000
+
+def main():
+    """Run the JSON benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=10000, help='items in the checklist')
+    parser.add_argument('--repeat', type=int, default=10, help='runs per measurement')
+    args = parser.parse_args()
+
+    rows = make_rows(args.items)
+    tree, _ = build_item_tree(rows)
+    app = Flask(__name__)
+
+    encoders = [('stdlib', FastJSONProvider(app, use_orjson=False))]
+    if orjson is not None:
+        encoders.append(('orjson', FastJSONProvider(app, use_orjson=True)))
+
+    print("Smart Checklist JSON Benchmark")
+    print("=" * 40)
+    print(f"Items: {args.items}, bytes: {len(encoders[0][1].dumpb({'items': tree}))}")
+    if orjson is None:
+        print("orjson is not installed; only the stdlib encoder is measured")
+    print(f"{'encoder':>8}  {'tree':>10}  {'rows+dict':>10}  {'rows':>10}")
+
+    baseline = None
+    for name, provider in encoders:
+        tree_ms = best_of(lambda: provider.dumpb({'items': tree}), args.repeat)
+        copied_ms = best_of(lambda: provider.dumpb({'items': [dict(row) for row in rows]}), args.repeat)
+        rows_ms = best_of(lambda: provider.dumpb({'items': rows}), args.repeat)
+        print(f"{name:>8}  {tree_ms:>8.2f}ms  {copied_ms:>8.2f}ms  {rows_ms:>8.2f}ms")
+        if baseline is None:
+            baseline = tree_ms
+        else:
+            print(f"   tree speedup over stdlib: {baseline / tree_ms:.2f}x")
+
+if __name__ == '__main__':
+    main()
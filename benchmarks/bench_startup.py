@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for Smart Checklist App
+
+Measures, in fresh interpreter processes, how long it takes to import the
+app module and to build an app with create_app against a new and an
+already-initialized database. Each measurement is repeated and the median
+is reported.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs N]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside a child interpreter so every sample starts cold
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app({"DATABASE": sys.argv[1], "SECRET_KEY": "bench"})
+created = time.perf_counter()
+app.create_app({"DATABASE": sys.argv[1], "SECRET_KEY": "bench"})
+recreated = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "create_app": created - imported,
+    "create_app_again": recreated - created,
+}))
+'''
+
+def run_probe(db_path):
+    """Run one cold-start sample and return its timings in seconds"""
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE, db_path],
+        cwd=ROOT, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    """Run the startup benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10, help='samples per measurement')
+    args = parser.parse_args()
+
+    print("Smart Checklist Startup Benchmark")
+    print("=" * 40)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fresh, existing = [], []
+        shared_db = os.path.join(tmp, 'existing.sqlite')
+        run_probe(shared_db)  # Initialize once so later samples see a migrated file
+
+        for run in range(args.runs):
+            fresh.append(run_probe(os.path.join(tmp, f'fresh-{run}.sqlite')))
+            existing.append(run_probe(shared_db))
+
+    def median_ms(samples, key):
+        return statistics.median(sample[key] for sample in samples) * 1000
+
+    print(f"Runs per measurement: {args.runs}")
+    print(f"   import app:                  {median_ms(existing, 'import'):8.2f} ms")
+    print(f"   create_app, new database:    {median_ms(fresh, 'create_app'):8.2f} ms")
+    print(f"   create_app, existing file:   {median_ms(existing, 'create_app'):8.2f} ms")
+    print(f"   create_app, already checked: {median_ms(existing, 'create_app_again'):8.2f} ms")
+
+if __name__ == '__main__':
+    main()
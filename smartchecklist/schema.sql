@@ -1,21 +1,20 @@
-DROP TABLE IF EXISTS users;
-DROP TABLE IF EXISTS checklists;
-DROP TABLE IF EXISTS items;
+-- Baseline schema. Every statement must be safe to run against an existing
+-- database; later changes belong in MIGRATIONS in app.py.
 
-CREATE TABLE users (
+CREATE TABLE IF NOT EXISTS users (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     username TEXT UNIQUE NOT NULL,
     password TEXT NOT NULL
 );
 
-CREATE TABLE checklists (
+CREATE TABLE IF NOT EXISTS checklists (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     user_id INTEGER NOT NULL,
     title TEXT NOT NULL,
     FOREIGN KEY (user_id) REFERENCES users (id)
 );
 
-CREATE TABLE items (
+CREATE TABLE IF NOT EXISTS items (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     checklist_id INTEGER NOT NULL,
     parent_item_id INTEGER,
@@ -24,4 +23,4 @@ CREATE TABLE items (
     checked INTEGER NOT NULL DEFAULT 0,
     FOREIGN KEY (checklist_id) REFERENCES checklists (id),
     FOREIGN KEY (parent_item_id) REFERENCES items (id)
-); 
\ No newline at end of file
+);
@@ -11,9 +11,11 @@ set -e  # Exit on any error
 echo "🔄 Starting smartchecklist wheel build process..."
 echo ""
 
-# Step 1: Sync static files from package to root (package is the source of truth)
+# Step 1: Precompress static files, then sync them from package to root (package is the source of truth)
 echo "📁 Syncing static files..."
 if [ -d "smartchecklist/static" ]; then
+    echo "   • Writing .gz (and .br with brotli installed) variants in smartchecklist/static/"
+    python -c "import app; app.precompress_static('smartchecklist/static')"
     mkdir -p static
     echo "   • Copying smartchecklist/static/* → static/"
     cp smartchecklist/static/* static/
@@ -1,10 +1,17 @@
 import unittest
+import gzip
 import json
+import shutil
+import sqlite3
 import tempfile
 import os
 import sys
+import threading
+import time
 sys.path.append('..')  # Add parent directory to path
-from app import create_app, init_db
+from app import (create_app, init_db, get_db_connection, compact_changes, FastJSONProvider, LRUCache,
+                 IdempotencyStore, IdempotencyInProgress, StoredResponse, encode_page_cursor,
+                 precompress_static)
 
 
 class APITestCase(unittest.TestCase):
@@ -30,7 +37,8 @@ class APITestCase(unittest.TestCase):
             'TESTING': True,
             'DATABASE': self.db_path,
             'SECRET_KEY': 'test-secret-key',
-            'WTF_CSRF_ENABLED': False  # Disable CSRF for testing
+            'WTF_CSRF_ENABLED': False,  # Disable CSRF for testing
+            'STATS_USERS': ('testuser',)
         })
         
         # Initialize the test database
@@ -45,8 +53,13 @@ class APITestCase(unittest.TestCase):
 
     def tearDown(self):
         """Clean up after each test method."""
+        self.app.extensions['db_pool'].close_idle()
         os.close(self.db_fd)
         os.unlink(self.db_path)
+        # WAL mode keeps side files next to the database
+        for suffix in ('-wal', '-shm'):
+            if os.path.exists(self.db_path + suffix):
+                os.unlink(self.db_path + suffix)
 
     def _create_and_login_user(self):
         """Helper method to create and login a test user"""
@@ -406,6 +419,173 @@ class APITestCase(unittest.TestCase):
         self._api_request('GET', f'/api/checklists/{checklist_id}/items/{parent_id}', expected_status=404)
         self._api_request('GET', f'/api/checklists/{checklist_id}/items/{subitem_id}', expected_status=404)
 
+    def test_delete_deep_subtree(self):
+        """Test that deleting deeply nested items is one statement and reports the count"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Deep'}, 201)['id']
+        root_id = self._api_request('POST', f'/api/checklists/{checklist_id}/items',
+                                    {'content': 'Root'}, 201)['id']
+        keep_id = self._api_request('POST', f'/api/checklists/{checklist_id}/items',
+                                    {'content': 'Sibling'}, 201)['id']
+        
+        # Build a chain deeper than Python's recursion limit directly in the database
+        db = get_db_connection(self.db_path)
+        parent_id = root_id
+        for depth in range(1500):
+            parent_id = db.execute(
+                'INSERT INTO items (checklist_id, parent_item_id, content) VALUES (?, ?, ?)',
+                (checklist_id, parent_id, f'Level {depth}')
+            ).lastrowid
+        db.commit()
+        db.close()
+        
+        response = self._api_request('DELETE', f'/api/checklists/{checklist_id}/items/{root_id}')
+        self.assertEqual(response['deleted_items'], 1501)
+        
+        remaining = self._api_request('GET', f'/api/checklists/{checklist_id}/items')['items']
+        self.assertEqual([item['id'] for item in remaining], [keep_id])
+
+    def test_batch_create_nested_items(self):
+        """Test creating a nested tree of items in one request"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Packing'}, 201)['id']
+        
+        response = self._api_request('POST', f'/api/checklists/{checklist_id}/items:batch', {
+            'items': [
+                {'content': 'Clothes', 'subitems': [
+                    {'content': 'Socks', 'checked': True},
+                    {'content': 'Shirts'},
+                ]},
+                {'content': 'Tickets', 'url': 'example.com/tickets'},
+            ]
+        }, 201)
+        
+        self.assertEqual(len(response['ids']), 4)
+        self.assertEqual(response['ids'], sorted(response['ids']))
+        
+        items = self._api_request('GET', f'/api/checklists/{checklist_id}/items')['items']
+        self.assertEqual([item['content'] for item in items], ['Clothes', 'Tickets'])
+        self.assertEqual([sub['content'] for sub in items[0]['subitems']], ['Socks', 'Shirts'])
+        self.assertEqual(items[0]['subitems'][0]['checked'], 1)
+        self.assertEqual(items[1]['url'], 'https://example.com/tickets')
+
+    def test_batch_create_flat_items_with_temp_ids(self):
+        """Test that flat batches resolve client-side parent references"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Flat'}, 201)['id']
+        existing_id = self._api_request('POST', f'/api/checklists/{checklist_id}/items',
+                                        {'content': 'Existing'}, 201)['id']
+        
+        response = self._api_request('POST', f'/api/checklists/{checklist_id}/items:batch', {
+            'items': [
+                {'temp_id': 'a', 'content': 'Parent'},
+                {'temp_id': 'b', 'parent_temp_id': 'a', 'content': 'Child'},
+                {'parent_item_id': existing_id, 'content': 'Under existing'},
+            ]
+        }, 201)
+        
+        parent_id, child_id, other_id = response['ids']
+        self.assertEqual(response['temp_ids'], {'a': parent_id, 'b': child_id})
+        child = self._api_request('GET', f'/api/checklists/{checklist_id}/items/{child_id}')
+        self.assertEqual(child['parent_item_id'], parent_id)
+        other = self._api_request('GET', f'/api/checklists/{checklist_id}/items/{other_id}')
+        self.assertEqual(other['parent_item_id'], existing_id)
+
+    def test_batch_create_mixed_temp_ids(self):
+        """Test that integer and string temp_ids come back as string keys with either encoder"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Mixed'}, 201)['id']
+        app = create_app({'TESTING': True, 'DATABASE': self.db_path, 'SECRET_KEY': 'test',
+                          'JSON_USE_ORJSON': False})
+        self.addCleanup(app.extensions['db_pool'].close_idle)
+        self.client = app.test_client()
+        self.client.post('/login', data={'username': 'testuser', 'password': 'testpass123'})
+        
+        response = self._api_request('POST', f'/api/checklists/{checklist_id}/items:batch', {
+            'items': [{'temp_id': 1, 'content': 'One'}, {'temp_id': 'x', 'parent_temp_id': '1', 'content': 'X'}]
+        }, 201)
+        one_id, x_id = response['ids']
+        self.assertEqual(response['temp_ids'], {'1': one_id, 'x': x_id})
+        self.assertEqual(self._api_request('GET', f'/api/checklists/{checklist_id}/items/{x_id}')['parent_item_id'],
+                         one_id)
+
+    def test_batch_create_validation(self):
+        """Test that an invalid entry rejects the whole batch"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Invalid'}, 201)['id']
+        url = f'/api/checklists/{checklist_id}/items:batch'
+        
+        response = self._api_request('POST', url, {'items': [{'content': 'Ok'}, {'content': '  '}]}, 400)
+        self.assertEqual(response['error'], 'Content cannot be empty')
+        self.assertEqual(response['index'], 1)
+        
+        response = self._api_request('POST', url, {'items': [{'content': 'Orphan', 'parent_temp_id': 'x'}]}, 400)
+        self.assertEqual(response['error'], 'Unknown parent_temp_id')
+        
+        response = self._api_request('POST', url, {'items': [{'content': 'Ok'}, {'content': 'List', 'temp_id': ['a']}]}, 400)
+        self.assertEqual((response['error'], response['index']), ('Invalid temp_id', 1))
+        response = self._api_request('POST', url, {'items': [{'content': 'Map', 'parent_temp_id': {'a': 1}}]}, 400)
+        self.assertEqual(response['error'], 'Invalid parent_temp_id')
+        response = self._api_request('POST', url, {'items': [{'content': 'Huge', 'parent_item_id': 10 ** 30}]}, 400)
+        self.assertEqual(response['error'], 'Invalid parent_item_id')
+        response = self._api_request('POST', url, {'items': [{'content': 'A', 'temp_id': 1},
+                                                             {'content': 'B', 'temp_id': '1'}]}, 400)
+        self.assertEqual((response['error'], response['index']), ('Duplicate temp_id', 1))
+        
+        self._api_request('POST', url, {'items': [{'content': 'Bad parent', 'parent_item_id': 9999}]}, 404)
+        self._api_request('POST', '/api/checklists/9999/items:batch', {'items': [{'content': 'x'}]}, 404)
+        
+        items = self._api_request('GET', f'/api/checklists/{checklist_id}/items')['items']
+        self.assertEqual(items, [])
+
+    def test_batch_mutate_items(self):
+        """Test applying several operations with one request"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Run'}, 201)['id']
+        ids = self._api_request('POST', f'/api/checklists/{checklist_id}/items:batch', {
+            'items': [{'content': 'A'}, {'content': 'B', 'subitems': [{'content': 'B1'}]}, {'content': 'C'}]
+        }, 201)['ids']
+        a_id, b_id, b1_id, c_id = ids
+        
+        response = self._api_request('POST', f'/api/checklists/{checklist_id}/items:mutate', {
+            'operations': [
+                {'op': 'toggle', 'id': a_id},
+                {'op': 'toggle', 'id': a_id},
+                {'op': 'set_checked', 'id': c_id, 'checked': True},
+                {'op': 'update', 'id': c_id, 'content': 'C edited', 'url': 'example.com'},
+                {'op': 'delete', 'id': b_id},
+            ]
+        })
+        
+        results = response['results']
+        self.assertEqual([result['checked'] for result in results[:3]], [True, False, True])
+        self.assertEqual(results[3]['url'], 'https://example.com')
+        self.assertEqual(results[4]['deleted_items'], 2)
+        
+        items = self._api_request('GET', f'/api/checklists/{checklist_id}/items')['items']
+        self.assertEqual([(item['content'], item['checked']) for item in items],
+                         [('A', 0), ('C edited', 1)])
+
+    def test_batch_mutate_is_atomic(self):
+        """Test that one failing operation rolls back the whole batch"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Atomic'}, 201)['id']
+        parent_id, child_id = self._api_request('POST', f'/api/checklists/{checklist_id}/items:batch', {
+            'items': [{'content': 'Parent', 'subitems': [{'content': 'Child'}]}]
+        }, 201)['ids']
+        url = f'/api/checklists/{checklist_id}/items:mutate'
+        
+        # The child disappears with its parent, so toggling it afterwards fails
+        response = self._api_request('POST', url, {'operations': [
+            {'op': 'toggle', 'id': parent_id},
+            {'op': 'delete', 'id': parent_id},
+            {'op': 'toggle', 'id': child_id},
+        ]}, 404)
+        self.assertEqual(response['index'], 2)
+        
+        items = self._api_request('GET', f'/api/checklists/{checklist_id}/items')['items']
+        self.assertEqual(items[0]['checked'], 0)
+        self.assertEqual(len(items[0]['subitems']), 1)
+        
+        response = self._api_request('POST', url, {'operations': [{'op': 'rename', 'id': parent_id}]}, 400)
+        self.assertEqual(response['index'], 0)
+        response = self._api_request('POST', url, {'operations': [{'op': 'toggle', 'id': parent_id},
+                                                                  {'op': 'toggle', 'id': 10 ** 30}]}, 400)
+        self.assertEqual((response['error'], response['index']), ('Invalid id', 1))
+
     # ========================================
     # AUTHORIZATION TESTS
     # ========================================
@@ -428,6 +608,1136 @@ class APITestCase(unittest.TestCase):
         self._api_request('PUT', f'/api/checklists/{checklist_id}', {'title': 'Hacked'}, 404)
         self._api_request('DELETE', f'/api/checklists/{checklist_id}', expected_status=404)
 
+    def test_item_mutation_isolation(self):
+        """Test that users cannot modify items in other users' checklists"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'User 1 Checklist'}, 201)['id']
+        item_id = self._api_request('POST', f'/api/checklists/{checklist_id}/items',
+                                    {'content': 'Private'}, 201)['id']
+
+        self.client.get('/logout')
+        self.client.post('/register', data={'username': 'user2', 'password': 'pass2'})
+        self.client.post('/login', data={'username': 'user2', 'password': 'pass2'})
+        other_id = self._api_request('POST', '/api/checklists', {'title': 'User 2 Checklist'}, 201)['id']
+
+        item_url = f'/api/checklists/{checklist_id}/items/{item_id}'
+        self._api_request('PUT', item_url, {'content': 'Hacked'}, 404)
+        self._api_request('POST', f'{item_url}/toggle', expected_status=404)
+        self._api_request('DELETE', item_url, expected_status=404)
+        # Pointing at one's own checklist does not reach the foreign item either
+        self._api_request('PUT', f'/api/checklists/{other_id}/items/{item_id}', {'content': 'Hacked'}, 404)
+
+        self.client.get('/logout')
+        self._create_and_login_user()
+        item = self._api_request('GET', item_url)
+        self.assertEqual((item['content'], item['checked']), ('Private', 0))
+
+
+    # ========================================
+    # CONNECTION MANAGEMENT TESTS
+    # ========================================
+
+    def test_pool_reuses_released_connection(self):
+        """Test that a released connection is handed out again"""
+        pool = self.app.extensions['db_pool']
+        first = pool.acquire()
+        pool.release(first)
+        second = pool.acquire()
+        self.assertIs(first, second)
+        pool.release(second)
+
+    def test_pool_reports_hits(self):
+        """Test that warmed connections are reused across requests"""
+        for _ in range(3):
+            self._api_request('GET', '/api/checklists')
+        
+        stats = self._api_request('GET', '/api/stats')['db_pool']
+        self.assertGreater(stats['hits'], 0)
+        self.assertGreaterEqual(stats['misses'], 1)
+        self.assertIn('hit_rate', stats)
+
+    def test_stats_limited_to_operators(self):
+        """Test that process-wide counters are hidden from ordinary accounts"""
+        self.client.get('/logout')
+        self.client.post('/register', data={'username': 'user2', 'password': 'pass2'})
+        self.client.post('/login', data={'username': 'user2', 'password': 'pass2'})
+        self._api_request('GET', '/api/stats', expected_status=404)
+        
+        self.app.config['STATS_USERS'] = ()
+        self.client.get('/logout')
+        self.client.post('/login', data={'username': 'testuser', 'password': 'testpass123'})
+        self._api_request('GET', '/api/stats', expected_status=404)
+
+    def test_database_uses_wal_profile(self):
+        """Test that the configured pragma profile is applied"""
+        with self.app.app_context():
+            pool = self.app.extensions['db_pool']
+            db = pool.acquire()
+            self.assertEqual(db.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+            self.assertEqual(db.execute('PRAGMA busy_timeout').fetchone()[0], 5000)
+            self.assertEqual(db.execute('PRAGMA cache_size').fetchone()[0], -16000)
+            pool.release(db)
+
+    def test_unknown_pragma_profile_rejected(self):
+        """Test that a typo in DATABASE_PRAGMAS fails fast"""
+        with self.assertRaises(ValueError):
+            create_app({'DATABASE': self.db_path, 'DATABASE_PRAGMAS': 'turbo'})
+
+    def test_reader_not_blocked_by_writer(self):
+        """Test that a reader sees committed data while a write is open"""
+        self._api_request('POST', '/api/checklists', {'title': 'Committed'}, 201)
+        
+        writer = get_db_connection(self.db_path)
+        reader = get_db_connection(self.db_path, {'busy_timeout': 0})
+        try:
+            writer.execute('BEGIN IMMEDIATE')
+            writer.execute("INSERT INTO checklists (user_id, title) VALUES (1, 'Pending')")
+            
+            titles = [row['title'] for row in reader.execute('SELECT title FROM checklists')]
+            self.assertEqual(titles, ['Committed'])
+        finally:
+            writer.rollback()
+            writer.close()
+            reader.close()
+
+    # ========================================
+    # USER CACHE TESTS
+    # ========================================
+
+    def test_user_loader_uses_cache(self):
+        """Test that authenticated requests reuse the cached user"""
+        for _ in range(3):
+            self._api_request('GET', '/api/checklists')
+        
+        stats = self._api_request('GET', '/api/stats')['user_cache']
+        self.assertGreaterEqual(stats['hits'], 3)
+        self.assertEqual(stats['entries'], 1)
+
+    def test_user_cache_invalidation(self):
+        """Test that an invalidated user is reloaded from the database"""
+        self._api_request('GET', '/api/checklists')
+        user_cache = self.app.extensions['user_cache']
+        misses = user_cache.stats()['misses']
+        
+        user_cache.invalidate('1')
+        self._api_request('GET', '/api/checklists')
+        
+        self.assertEqual(user_cache.stats()['misses'], misses + 1)
+
+    def test_user_cache_entries_expire(self):
+        """Test that cached entries expire after the TTL and respect the size bound"""
+        now = [0.0]
+        cache = LRUCache(max_entries=2, ttl=10, clock=lambda: now[0])
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('a'))  # Evicted as least recently used
+        self.assertEqual(cache.get('c'), 3)
+        
+        now[0] = 11.0
+        self.assertIsNone(cache.get('c'))
+
+    # ========================================
+    # PAGINATION TESTS
+    # ========================================
+
+    def test_paginate_checklists(self):
+        """Test walking all checklists with keyset cursors"""
+        for i in range(5):
+            self._api_request('POST', '/api/checklists', {'title': f'List {i}'}, 201)
+        
+        titles, cursor = [], None
+        pages = 0
+        while True:
+            url = '/api/checklists?limit=2' + (f'&cursor={cursor}' if cursor else '')
+            page = self._api_request('GET', url)
+            titles += [checklist['title'] for checklist in page['checklists']]
+            pages += 1
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        
+        self.assertEqual(pages, 3)
+        self.assertEqual(titles, [f'List {i}' for i in range(5)])
+        
+        # Without limit the full list is returned as before
+        response = self._api_request('GET', '/api/checklists')
+        self.assertEqual(len(response['checklists']), 5)
+        self.assertNotIn('next_cursor', response)
+
+    def test_paginate_items(self):
+        """Test that paginated items come back flat with parent ids"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Paged'}, 201)['id']
+        ids = self._api_request('POST', f'/api/checklists/{checklist_id}/items:batch', {
+            'items': [{'content': 'A', 'subitems': [{'content': 'A1'}]}, {'content': 'B'}]
+        }, 201)['ids']
+        
+        first = self._api_request('GET', f'/api/checklists/{checklist_id}/items?limit=2')
+        self.assertEqual([item['id'] for item in first['items']], ids[:2])
+        self.assertEqual(first['items'][1]['parent_item_id'], ids[0])
+        
+        second = self._api_request('GET', f"/api/checklists/{checklist_id}/items?limit=2&cursor={first['next_cursor']}")
+        self.assertEqual([item['id'] for item in second['items']], ids[2:])
+        self.assertIsNone(second['next_cursor'])
+
+    def test_pagination_validation(self):
+        """Test that bad limits and cursors are rejected"""
+        self._api_request('GET', '/api/checklists?limit=0', expected_status=400)
+        self._api_request('GET', '/api/checklists?limit=abc', expected_status=400)
+        response = self._api_request('GET', '/api/checklists?limit=2&cursor=not-a-cursor', expected_status=400)
+        self.assertEqual(response['error'], 'Invalid cursor')
+        # Ids SQLite cannot hold are malformed too, not a server error
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Huge'}, 201)['id']
+        huge = encode_page_cursor(10 ** 30)
+        self._api_request('GET', f'/api/checklists?cursor={huge}', expected_status=400)
+        self._api_request('GET', f'/api/checklists/{checklist_id}/items?cursor={huge}', expected_status=400)
+        self.assertEqual(self.client.get(f'/dashboard?cursor={huge}').status_code, 302)
+
+    def test_dashboard_pagination(self):
+        """Test that the dashboard links to the next page when paginated"""
+        for i in range(3):
+            self._api_request('POST', '/api/checklists', {'title': f'Board {i}'}, 201)
+        
+        html = self.client.get('/dashboard?limit=2').data.decode('utf-8')
+        self.assertIn('Board 1', html)
+        self.assertNotIn('Board 2', html)
+        self.assertIn('More Checklists', html)
+        
+        html = self.client.get('/dashboard').data.decode('utf-8')
+        self.assertIn('Board 2', html)
+        self.assertNotIn('More Checklists', html)
+
+    # ========================================
+    # STREAMING TESTS
+    # ========================================
+
+    def test_stream_checklist_ndjson(self):
+        """Test streaming a checklist as newline-delimited JSON"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Streamed'}, 201)['id']
+        ids = self._api_request('POST', f'/api/checklists/{checklist_id}/items:batch', {
+            'items': [{'content': 'A', 'subitems': [{'content': 'A1'}]}, {'content': 'B'}]
+        }, 201)['ids']
+        
+        response = self.client.get(f'/api/checklists/{checklist_id}?format=ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        
+        lines = [json.loads(line) for line in response.data.decode('utf-8').splitlines()]
+        self.assertEqual(lines[0]['title'], 'Streamed')
+        self.assertEqual([line['id'] for line in lines[1:]], ids)
+        self.assertEqual(lines[2]['parent_item_id'], ids[0])
+
+    def test_stream_items_via_accept_header(self):
+        """Test that Accept: application/x-ndjson selects streaming"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Accept'}, 201)['id']
+        self._api_request('POST', f'/api/checklists/{checklist_id}/items', {'content': 'Only'}, 201)
+        
+        response = self.client.get(f'/api/checklists/{checklist_id}/items',
+                                   headers={'Accept': 'application/x-ndjson'})
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        lines = response.data.decode('utf-8').splitlines()
+        self.assertEqual([json.loads(line)['content'] for line in lines], ['Only'])
+        
+        self._api_request('GET', f'/api/checklists/{checklist_id}/items?format=xml', expected_status=400)
+        self._api_request('GET', f'/api/checklists/{checklist_id}/items?format=ndjson&limit=5',
+                          expected_status=400)
+
+    # ========================================
+    # CONDITIONAL GET TESTS
+    # ========================================
+
+    def test_checklist_etag_revalidation(self):
+        """Test that an unchanged checklist answers If-None-Match with 304"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Polled'}, 201)['id']
+        item_id = self._api_request('POST', f'/api/checklists/{checklist_id}/items', {'content': 'A'}, 201)['id']
+        url = f'/api/checklists/{checklist_id}'
+        
+        first = self.client.get(url)
+        etag = first.headers['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        
+        cached = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.data, b'')
+        
+        # Every item mutation moves the version on
+        self._api_request('POST', f'{url}/items/{item_id}/toggle')
+        changed = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers['ETag'], etag)
+        self.assertEqual(json.loads(changed.data)['version'], json.loads(first.data)['version'] + 1)
+
+    def test_etag_changes_with_every_mutation_path(self):
+        """Test that web routes, API routes and batches all bump the version"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Versions'}, 201)['id']
+        url = f'/api/checklists/{checklist_id}'
+        
+        def version():
+            return self._api_request('GET', url)['version']
+        
+        mutations = [
+            lambda: self.client.post(f'/add_item/{checklist_id}', data={'content': 'Web'}),
+            lambda: self._api_request('POST', f'{url}/items', {'content': 'Api'}, 201),
+            lambda: self._api_request('POST', f'{url}/items:batch', {'items': [{'content': 'Batch'}]}, 201),
+            lambda: self.client.post('/toggle_item/1'),
+            lambda: self.client.post('/edit_item/1', data={'content': 'Web edited'}),
+            lambda: self._api_request('PUT', f'{url}/items/2', {'content': 'Api edited'}),
+            lambda: self._api_request('POST', f'{url}/items:mutate', {'operations': [{'op': 'toggle', 'id': 3}]}),
+            lambda: self._api_request('PUT', url, {'title': 'Renamed'}),
+            lambda: self._api_request('DELETE', f'{url}/items/3'),
+            lambda: self.client.post('/delete_item/2'),
+        ]
+        seen = [version()]
+        for mutate in mutations:
+            mutate()
+            seen.append(version())
+        self.assertEqual(seen, sorted(set(seen)))
+
+    def test_representations_have_distinct_etags(self):
+        """Test that streamed and tree responses do not share an ETag"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Variants'}, 201)['id']
+        tree = self.client.get(f'/api/checklists/{checklist_id}')
+        stream = self.client.get(f'/api/checklists/{checklist_id}?format=ndjson')
+        items = self.client.get(f'/api/checklists/{checklist_id}/items')
+        
+        etags = {tree.headers['ETag'], stream.headers['ETag'], items.headers['ETag']}
+        self.assertEqual(len(etags), 3)
+
+    def test_accept_negotiated_format_has_own_etag(self):
+        """Test that a format picked through Accept is tagged and cached separately"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Negotiated'}, 201)['id']
+        ndjson = {'Accept': 'application/x-ndjson'}
+        for url in (f'/api/checklists/{checklist_id}', f'/api/checklists/{checklist_id}/items'):
+            tree = self.client.get(url)
+            self.assertIn('Accept', tree.headers['Vary'])
+            
+            response = self.client.get(url, headers={**ndjson, 'If-None-Match': tree.headers['ETag']})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.mimetype, 'application/x-ndjson')
+            self.assertNotEqual(response.headers['ETag'], tree.headers['ETag'])
+            self.assertIn('Accept', response.headers['Vary'])
+            
+            response = self.client.get(url, headers={**ndjson, 'If-None-Match': response.headers['ETag']})
+            self.assertEqual(response.status_code, 304)
+            self.assertIn('Accept', response.headers['Vary'])
+
+    # ========================================
+    # TREE CACHE TESTS
+    # ========================================
+
+    def test_checklist_tree_cache(self):
+        """Test that repeated reads are served from the cache until a write"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Cached'}, 201)['id']
+        item_id = self._api_request('POST', f'/api/checklists/{checklist_id}/items', {'content': 'A'}, 201)['id']
+        tree_cache = self.app.extensions['tree_cache']
+        
+        first = self._api_request('GET', f'/api/checklists/{checklist_id}')
+        second = self._api_request('GET', f'/api/checklists/{checklist_id}')
+        self.assertEqual(first, second)
+        self.assertGreaterEqual(tree_cache.stats()['hits'], 1)
+        self.assertEqual(tree_cache.stats()['entries'], 1)
+        
+        # A write drops the entry and the next read sees the change
+        self._api_request('PUT', f'/api/checklists/{checklist_id}/items/{item_id}', {'content': 'A edited'})
+        self.assertEqual(tree_cache.stats()['entries'], 0)
+        third = self._api_request('GET', f'/api/checklists/{checklist_id}')
+        self.assertEqual(third['items'][0]['content'], 'A edited')
+
+    def test_checklist_html_cache(self):
+        """Test that the checklist page is cached and refreshed after edits"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Page'}, 201)['id']
+        self.client.post(f'/add_item/{checklist_id}', data={'content': 'Before'})
+        
+        first = self.client.get(f'/checklist/{checklist_id}').data
+        self.assertEqual(self.client.get(f'/checklist/{checklist_id}').data, first)
+        
+        self.client.post(f'/add_item/{checklist_id}', data={'content': 'After'})
+        html = self.client.get(f'/checklist/{checklist_id}').data.decode('utf-8')
+        self.assertIn('After', html)
+
+    def test_tree_cache_evicts_by_size(self):
+        """Test that the cache stays within its byte budget"""
+        cache = LRUCache(max_entries=100, max_bytes=100, sizeof=len)
+        cache.set('a', b'x' * 60)
+        cache.set('b', b'x' * 30)
+        cache.get('a')
+        cache.set('c', b'x' * 30)  # Evicts b, the least recently used
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.stats()['bytes'], 90)
+        
+        cache.set('huge', b'x' * 500)  # Larger than the whole budget
+        self.assertIsNone(cache.get('huge'))
+
+    # ========================================
+    # SUBTREE LOADING TESTS
+    # ========================================
+
+    def _create_deep_checklist(self):
+        """Helper creating A > B > C plus a sibling D, returning (checklist_id, ids)"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Deep'}, 201)['id']
+        ids = self._api_request('POST', f'/api/checklists/{checklist_id}/items:batch', {
+            'items': [
+                {'content': 'A', 'subitems': [
+                    {'content': 'B', 'subitems': [{'content': 'C'}]},
+                ]},
+                {'content': 'D'},
+            ]
+        }, 201)['ids']
+        return checklist_id, dict(zip('ABCD', ids))
+
+    def test_depth_limits_the_tree(self):
+        """Test that depth=1 returns top-level items with their child counts"""
+        checklist_id, ids = self._create_deep_checklist()
+        
+        response = self._api_request('GET', f'/api/checklists/{checklist_id}?depth=1')
+        items = response['items']
+        self.assertEqual([item['content'] for item in items], ['A', 'D'])
+        self.assertEqual([item['subitems'] for item in items], [[], []])
+        self.assertEqual([item['child_count'] for item in items], [1, 0])
+        self.assertEqual([item['has_children'] for item in items], [True, False])
+        
+        items = self._api_request('GET', f'/api/checklists/{checklist_id}/items?depth=2')['items']
+        self.assertEqual(items[0]['subitems'][0]['content'], 'B')
+        self.assertEqual(items[0]['subitems'][0]['subitems'], [])
+        self.assertTrue(items[0]['subitems'][0]['has_children'])
+
+    def test_root_expands_one_node(self):
+        """Test that root=<id> returns only that item's descendants"""
+        checklist_id, ids = self._create_deep_checklist()
+        
+        response = self._api_request('GET', f'/api/checklists/{checklist_id}/items?root={ids["A"]}&depth=1')
+        self.assertEqual(response['root'], ids['A'])
+        self.assertEqual([item['id'] for item in response['items']], [ids['B']])
+        self.assertEqual(response['items'][0]['child_count'], 1)
+        
+        # Without depth the whole subtree comes back
+        items = self._api_request('GET', f'/api/checklists/{checklist_id}?root={ids["A"]}')['items']
+        self.assertEqual(items[0]['subitems'][0]['content'], 'C')
+        self.assertFalse(items[0]['subitems'][0]['has_children'])
+        
+        leaf = self._api_request('GET', f'/api/checklists/{checklist_id}/items?root={ids["D"]}')
+        self.assertEqual(leaf['items'], [])
+
+    def test_subtree_argument_errors(self):
+        """Test validation of root and depth"""
+        checklist_id, ids = self._create_deep_checklist()
+        other_id = self._api_request('POST', '/api/checklists', {'title': 'Other'}, 201)['id']
+        url = f'/api/checklists/{checklist_id}/items'
+        
+        self._api_request('GET', url + '?depth=0', expected_status=400)
+        self._api_request('GET', url + '?depth=x', expected_status=400)
+        self._api_request('GET', url + '?root=x', expected_status=400)
+        self._api_request('GET', url + '?depth=99999999999999999999', expected_status=400)
+        self._api_request('GET', url + f'?root={2 ** 63}', expected_status=400)
+        self._api_request('GET', f'/api/checklists/{checklist_id}?root=-{2 ** 64}', expected_status=400)
+        self._api_request('GET', url + '?depth=1&limit=10', expected_status=400)
+        self._api_request('GET', f'/api/checklists/{checklist_id}?depth=1&format=ndjson', expected_status=400)
+        # The root must belong to the requested checklist
+        self._api_request('GET', f'/api/checklists/{other_id}/items?root={ids["A"]}', expected_status=404)
+
+    def _loop_items(self, *item_ids):
+        """Helper parenting each item on the next and the last on the first, forming a cycle"""
+        db = get_db_connection(self.db_path)
+        for child, parent in zip(item_ids, item_ids[1:] + item_ids[:1]):
+            db.execute('UPDATE items SET parent_item_id = ? WHERE id = ?', (parent, child))
+        db.commit()
+        db.close()
+
+    def test_subtree_load_stops_on_cycles(self):
+        """Test that a parent_item_id cycle cannot make a subtree load run forever"""
+        checklist_id, ids = self._create_deep_checklist()
+        self._loop_items(ids['C'], ids['B'], ids['A'])
+        self._loop_items(ids['D'])
+        url = f'/api/checklists/{checklist_id}'
+        
+        self._api_request('GET', f'{url}?root={ids["A"]}')
+        self._api_request('GET', f'{url}/items?root={ids["D"]}')
+        response = self._api_request('GET', f'{url}/items?root={ids["A"]}&depth=10')
+        self.assertEqual(response['items'], [])
+
+    def test_delete_stops_on_cycles(self):
+        """Test that deleting an item on a parent_item_id cycle removes the loop and returns"""
+        checklist_id, ids = self._create_deep_checklist()
+        self._loop_items(ids['C'], ids['B'], ids['A'])
+        url = f'/api/checklists/{checklist_id}'
+        
+        response = self._api_request('POST', f'{url}/items:mutate', {'operations': [{'op': 'delete', 'id': ids['B']}]})
+        self.assertEqual(response['results'][0]['deleted_items'], 3)
+        items = self._api_request('GET', f'{url}/items')['items']
+        self.assertEqual([item['id'] for item in items], [ids['D']])
+        
+        # The single-item routes take the same walk
+        self._loop_items(ids['D'])
+        response = self._api_request('DELETE', f'{url}/items/{ids["D"]}')
+        self.assertEqual(response['deleted_items'], 1)
+        second = self._api_request('POST', f'{url}/items', {'content': 'E'}, 201)['id']
+        self._loop_items(second)
+        self.assertEqual(self.client.post(f'/delete_item/{second}').status_code, 200)
+        self.assertEqual(self._api_request('GET', f'{url}/items')['items'], [])
+
+    def test_web_add_item_checks_parent(self):
+        """Test that the web form refuses a parent that is not an item of the checklist"""
+        checklist_id, ids = self._create_deep_checklist()
+        other_id = self._api_request('POST', '/api/checklists', {'title': 'Other'}, 201)['id']
+        other_item = self._api_request('POST', f'/api/checklists/{other_id}/items', {'content': 'X'}, 201)['id']
+        
+        for parent in (other_item + 1, other_item, 'x', 10 ** 30):
+            self.client.post(f'/add_item/{checklist_id}', data={'content': 'Loop', 'parent_item_id': parent})
+        self.client.post(f'/add_item/{checklist_id}', data={'content': 'Child', 'parent_item_id': ids['D']})
+        
+        items = self._api_request('GET', f'/api/checklists/{checklist_id}/items?root={ids["D"]}')['items']
+        self.assertEqual([item['content'] for item in items], ['Child'])
+        items = self._api_request('GET', f'/api/checklists/{checklist_id}/items?limit=100')['items']
+        self.assertEqual(len(items), 5)
+
+    # ========================================
+    # PROGRESS COUNTER TESTS
+    # ========================================
+
+    def test_progress_counters_follow_every_write(self):
+        """Test that item counters stay exact across all mutation paths"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Progress'}, 201)['id']
+        url = f'/api/checklists/{checklist_id}'
+        
+        def counters():
+            listed = self._api_request('GET', '/api/checklists')['checklists'][0]
+            return listed['checked_items'], listed['total_items']
+        
+        def actual():
+            items = self._api_request('GET', f'{url}/items?limit=1000')['items']
+            return sum(1 for item in items if item['checked']), len(items)
+        
+        mutations = [
+            lambda: self.client.post(f'/add_item/{checklist_id}', data={'content': 'Web'}),
+            lambda: self._api_request('POST', f'{url}/items', {'content': 'Api', 'parent_item_id': 1}, 201),
+            lambda: self._api_request('POST', f'{url}/items:batch', {'items': [
+                {'content': 'Batch', 'checked': True, 'subitems': [{'content': 'Nested', 'checked': True}]}
+            ]}, 201),
+            lambda: self.client.post('/toggle_item/1'),
+            lambda: self._api_request('PUT', f'{url}/items/2', {'checked': True}),
+            lambda: self._api_request('POST', f'{url}/items/3/toggle'),
+            lambda: self._api_request('POST', f'{url}/items:mutate', {'operations': [
+                {'op': 'set_checked', 'id': 4, 'checked': False}, {'op': 'delete', 'id': 3}
+            ]}),
+            lambda: self._api_request('DELETE', f'{url}/items/1'),
+        ]
+        for mutate in mutations:
+            mutate()
+            self.assertEqual(counters(), actual())
+        self.assertEqual(counters(), (0, 0))
+
+    def test_dashboard_shows_progress(self):
+        """Test that the dashboard renders done/total per checklist"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Shown'}, 201)['id']
+        self._api_request('POST', f'/api/checklists/{checklist_id}/items:batch', {'items': [
+            {'content': 'A', 'checked': True}, {'content': 'B'}, {'content': 'C'},
+        ]}, 201)
+        
+        html = self.client.get('/dashboard').data.decode('utf-8')
+        self.assertIn('1/3 done', html)
+        self.assertIn('width: 33%', html)
+
+    def test_recompute_counters_command(self):
+        """Test that the CLI repairs drifted counters"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Drift'}, 201)['id']
+        self._api_request('POST', f'/api/checklists/{checklist_id}/items', {'content': 'A'}, 201)
+        db = get_db_connection(self.db_path)
+        db.execute('UPDATE checklists SET total_items = 7, checked_items = 5')
+        db.commit()
+        db.close()
+        
+        result = self.app.test_cli_runner().invoke(args=['recompute-counters'])
+        self.assertIn('Repaired counters on 1 checklist(s)', result.output)
+        listed = self._api_request('GET', '/api/checklists')['checklists'][0]
+        self.assertEqual((listed['checked_items'], listed['total_items']), (0, 1))
+
+    # ========================================
+    # SPARSE FIELDSET AND COMPACT FORMAT TESTS
+    # ========================================
+
+    def test_get_item_does_not_leak_owner(self):
+        """Test that a single item response carries item columns only"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Private'}, 201)['id']
+        item_id = self._api_request('POST', f'/api/checklists/{checklist_id}/items', {'content': 'A'}, 201)['id']
+        
+        item = self._api_request('GET', f'/api/checklists/{checklist_id}/items/{item_id}')
+        self.assertNotIn('user_id', item)
+        
+        trimmed = self._api_request('GET', f'/api/checklists/{checklist_id}/items/{item_id}?fields=checked')
+        self.assertEqual(trimmed, {'id': item_id, 'checked': 0, 'subitems': []})
+
+    def test_fields_trim_item_payloads(self):
+        """Test that fields limits every item representation to those columns"""
+        checklist_id, ids = self._create_deep_checklist()
+        url = f'/api/checklists/{checklist_id}'
+        
+        items = self._api_request('GET', f'{url}?fields=id,checked')['items']
+        self.assertEqual(items[0], {'id': ids['A'], 'checked': 0, 'subitems': [
+            {'id': ids['B'], 'checked': 0, 'subitems': [{'id': ids['C'], 'checked': 0, 'subitems': []}]}
+        ]})
+        
+        page = self._api_request('GET', f'{url}/items?fields=content&limit=2')
+        self.assertEqual(page['items'], [{'id': ids['A'], 'content': 'A'}, {'id': ids['B'], 'content': 'B'}])
+        
+        partial = self._api_request('GET', f'{url}/items?fields=checked&depth=1')['items']
+        self.assertEqual(set(partial[0]), {'id', 'checked', 'child_count', 'has_children', 'subitems'})
+        
+        stream = self.client.get(f'{url}/items?format=ndjson&fields=content').data.decode('utf-8')
+        self.assertEqual(json.loads(stream.splitlines()[0]), {'id': ids['A'], 'content': 'A'})
+        
+        self._api_request('GET', f'{url}?fields=user_id', expected_status=400)
+        self._api_request('GET', f'{url}?fields=', expected_status=400)
+
+    def test_compact_format(self):
+        """Test the array-of-arrays encoding and its size against plain JSON"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Compact'}, 201)['id']
+        url = f'/api/checklists/{checklist_id}'
+        self._api_request('POST', f'{url}/items:batch', {'items': [
+            {'content': f'Item {n}', 'subitems': [{'content': f'Sub {n}'}]} for n in range(100)
+        ]}, 201)
+        
+        full = self.client.get(url).data
+        compact = self.client.get(f'{url}?format=compact')
+        body = json.loads(compact.data)
+        self.assertEqual(body['fields'], ['id', 'content', 'url', 'checked', 'subitems'])
+        self.assertEqual(body['items'][0], [1, 'Item 0', '', 0, [[2, 'Sub 0', '', 0, []]]])
+        self.assertLess(len(compact.data), len(full) / 2)
+        # Served from the cache on repeat
+        self.assertEqual(self.client.get(f'{url}?format=compact').data, compact.data)
+        
+        items = self._api_request('GET', f'{url}/items?format=compact&fields=checked')
+        self.assertEqual(items['fields'], ['id', 'checked', 'subitems'])
+        self.assertEqual(items['items'][0], [1, 0, [[2, 0, []]]])
+        
+        page = self._api_request('GET', f'{url}/items?format=compact&fields=parent_item_id&limit=2')
+        self.assertEqual(page['fields'], ['id', 'parent_item_id'])
+        self.assertEqual(page['items'], [[1, None], [2, 1]])
+        
+        partial = self._api_request('GET', f'{url}?format=compact&depth=1')
+        self.assertEqual(partial['fields'][-3:], ['child_count', 'has_children', 'subitems'])
+        self.assertEqual(partial['items'][0][-3:], [1, True, []])
+
+    # ========================================
+    # COMPRESSION TESTS
+    # ========================================
+
+    def test_large_responses_are_gzipped(self):
+        """Test that big JSON bodies are compressed and small ones are not"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Big'}, 201)['id']
+        url = f'/api/checklists/{checklist_id}'
+        small = self.client.get(url, headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', small.headers)
+        self.assertIn('Accept-Encoding', small.headers['Vary'])
+        
+        self._api_request('POST', f'{url}/items:batch', {'items': [
+            {'content': f'Item number {n}'} for n in range(200)
+        ]}, 201)
+        plain = self.client.get(url)
+        self.assertNotIn('Content-Encoding', plain.headers)
+        
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.data), plain.data)
+        self.assertLess(len(response.data), len(plain.data))
+        # The compressed variant gets a weak validator that still revalidates
+        self.assertTrue(response.headers['ETag'].startswith('W/'))
+        revalidated = self.client.get(url, headers={'Accept-Encoding': 'gzip',
+                                                    'If-None-Match': response.headers['ETag']})
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_streams_are_gzipped(self):
+        """Test that NDJSON streams are compressed chunk by chunk"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Stream'}, 201)['id']
+        url = f'/api/checklists/{checklist_id}/items?format=ndjson'
+        self._api_request('POST', f'/api/checklists/{checklist_id}/items', {'content': 'A'}, 201)
+        
+        plain = self.client.get(url).data
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.data), plain)
+
+    def test_precompressed_static_files(self):
+        """Test that built .gz variants are served to clients that accept them"""
+        static = tempfile.mkdtemp()
+        with open(os.path.join(static, 'styles.css'), 'w') as f:
+            f.write('body { color: black; }\n' * 200)
+        with open(os.path.join(static, 'tiny.css'), 'w') as f:
+            f.write('p {}\n')
+        self.assertEqual(precompress_static(static), [os.path.join(static, 'styles.css.gz')])
+        self.app.static_folder = static
+        
+        try:
+            response = self.client.get('/static/styles.css', headers={'Accept-Encoding': 'gzip'})
+            self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+            self.assertEqual(response.mimetype, 'text/css')
+            self.assertEqual(gzip.decompress(response.data), b'body { color: black; }\n' * 200)
+            response.close()
+            
+            response = self.client.get('/static/styles.css')
+            self.assertNotIn('Content-Encoding', response.headers)
+            response.close()
+        finally:
+            shutil.rmtree(static)
+
+    # ========================================
+    # JSON PROVIDER TESTS
+    # ========================================
+
+    def test_json_provider_serializes_rows(self):
+        """Test that both encoders emit the same JSON, rows included"""
+        db = sqlite3.connect(':memory:')
+        db.row_factory = sqlite3.Row
+        row = db.execute("SELECT 1 AS id, 'Ünïcode' AS content, NULL AS url").fetchone()
+        db.close()
+        payload = {'rows': [row], 'nested': {'b': 2, 'a': [1.5, True, None]}}
+        
+        outputs = set()
+        for use_orjson in (False, True):
+            provider = FastJSONProvider(self.app, use_orjson=use_orjson)
+            body = provider.dumpb(payload)
+            self.assertEqual(json.loads(body), {'rows': [{'id': 1, 'content': 'Ünïcode', 'url': None}],
+                                                'nested': {'a': [1.5, True, None], 'b': 2}})
+            outputs.add(json.dumps(provider.loads(body), sort_keys=True))
+        self.assertEqual(len(outputs), 1)
+
+    # ========================================
+    # DELTA SYNC TESTS
+    # ========================================
+
+    def test_sync_returns_changes_since_cursor(self):
+        """Test that sync reports upserts and tombstones after a cursor"""
+        cursor = self._api_request('GET', '/api/sync')['cursor']
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Synced'}, 201)['id']
+        url = f'/api/checklists/{checklist_id}'
+        ids = self._api_request('POST', f'{url}/items:batch', {'items': [
+            {'content': 'A', 'subitems': [{'content': 'A1'}]}, {'content': 'B'},
+        ]}, 201)['ids']
+        
+        response = self._api_request('GET', f'/api/sync?since={cursor}')
+        self.assertEqual([checklist['title'] for checklist in response['checklists']], ['Synced'])
+        self.assertEqual([item['id'] for item in response['items']], ids)
+        self.assertFalse(response['has_more'])
+        
+        # Only what changed after the new cursor comes back
+        cursor = response['cursor']
+        self._api_request('POST', f'{url}/items/{ids[2]}/toggle')
+        self._api_request('DELETE', f'{url}/items/{ids[0]}')
+        response = self._api_request('GET', f'/api/sync?since={cursor}')
+        self.assertEqual([(item['id'], item['checked']) for item in response['items']], [(ids[2], 1)])
+        self.assertEqual(response['deleted_items'], ids[:2])
+        self.assertEqual(response['checklists'], [])
+        
+        cursor = response['cursor']
+        self._api_request('DELETE', url)
+        response = self._api_request('GET', f'/api/sync?since={cursor}')
+        self.assertEqual(response['deleted_checklists'], [checklist_id])
+        self.assertEqual(response['deleted_items'], [ids[2]])
+        
+        empty = self._api_request('GET', f'/api/sync?since={response["cursor"]}')
+        self.assertEqual(empty['items'] + empty['checklists'], [])
+        self.assertEqual(empty['cursor'], response['cursor'])
+
+    def test_sync_pages_and_user_scope(self):
+        """Test sync paging and that other users' changes stay invisible"""
+        cursor = self._api_request('GET', '/api/sync')['cursor']
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Mine'}, 201)['id']
+        for content in 'ABC':
+            self._api_request('POST', f'/api/checklists/{checklist_id}/items', {'content': content}, 201)
+        
+        first = self._api_request('GET', f'/api/sync?since={cursor}&limit=2')
+        self.assertTrue(first['has_more'])
+        second = self._api_request('GET', f'/api/sync?since={first["cursor"]}&limit=2')
+        self.assertFalse(second['has_more'])
+        self.assertEqual(len(first['checklists'] + first['items'] + second['items']), 4)
+        
+        self.client.get('/logout')
+        self.client.post('/register', data={'username': 'user2', 'password': 'pass2'})
+        self.client.post('/login', data={'username': 'user2', 'password': 'pass2'})
+        other = self._api_request('GET', f'/api/sync?since={cursor}')
+        self.assertEqual(other['checklists'] + other['items'], [])
+        self._api_request('GET', '/api/sync?since=garbage', expected_status=400)
+        response = self._api_request('GET', f'/api/sync?since={encode_page_cursor(10 ** 30)}', expected_status=400)
+        self.assertEqual(response['error'], 'Invalid cursor')
+
+    def test_compact_changes(self):
+        """Test that compaction keeps the latest entries and expires old cursors"""
+        cursor = self._api_request('GET', '/api/sync')['cursor']
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Busy'}, 201)['id']
+        item_id = self._api_request('POST', f'/api/checklists/{checklist_id}/items', {'content': 'A'}, 201)['id']
+        for _ in range(5):
+            self._api_request('POST', f'/api/checklists/{checklist_id}/items/{item_id}/toggle')
+        
+        result = self.app.test_cli_runner().invoke(args=['compact-changes'])
+        self.assertIn('Removed 5 change log entries', result.output)
+        response = self._api_request('GET', f'/api/sync?since={cursor}')
+        self.assertEqual([item['checked'] for item in response['items']], [1])
+        
+        db = get_db_connection(self.db_path)
+        compact_changes(db, max_age=0, now=time.time() + 10)
+        db.commit()
+        db.close()
+        self._api_request('GET', f'/api/sync?since={cursor}', expected_status=410)
+
+    def test_sync_cursor_after_compaction(self):
+        """Test that a fresh cursor taken after compaction does not expire at once"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Old'}, 201)['id']
+        self._api_request('POST', f'/api/checklists/{checklist_id}/items', {'content': 'A'}, 201)
+        db = get_db_connection(self.db_path)
+        compact_changes(db, max_age=0, now=time.time() + 10)
+        db.commit()
+        db.close()
+        
+        # Both the compacted user and a user registered afterwards can sync
+        cursors = [self._api_request('GET', '/api/sync')['cursor']]
+        self.client.get('/logout')
+        self.client.post('/register', data={'username': 'user2', 'password': 'pass2'})
+        self.client.post('/login', data={'username': 'user2', 'password': 'pass2'})
+        cursors.append(self._api_request('GET', '/api/sync')['cursor'])
+        for cursor in cursors:
+            response = self._api_request('GET', f'/api/sync?since={cursor}')
+            self.assertEqual((response['items'], response['has_more']), ([], False))
+            self._api_request('GET', f"/api/sync?since={response['cursor']}")
+
+    # ========================================
+    # EVENT STREAM TESTS
+    # ========================================
+
+    def _read_events(self, chunks, count, timeout=5):
+        """Helper reading count SSE messages (heartbeats skipped) from a stream"""
+        events = []
+        deadline = time.monotonic() + timeout
+        while len(events) < count and time.monotonic() < deadline:
+            message = next(chunks).decode('utf-8')
+            if message.startswith('id:'):
+                fields = dict(line.split(': ', 1) for line in message.strip().splitlines())
+                events.append((int(fields['id']), fields['event'], json.loads(fields['data'])))
+        return events
+
+    def _open_stream(self, checklist_id, headers=None):
+        """Helper opening an event stream and returning its chunk iterator"""
+        response = self.client.get(f'/api/checklists/{checklist_id}/events', headers=headers, buffered=False)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        self.addCleanup(response.close)
+        chunks = response.iter_encoded()
+        self.assertTrue(next(chunks).startswith(b'retry:'))
+        return chunks
+
+    def test_event_stream_pushes_changes(self):
+        """Test that item changes reach an open stream as they happen"""
+        self.app.config['SSE_HEARTBEAT'] = 0.05
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Live'}, 201)['id']
+        url = f'/api/checklists/{checklist_id}'
+        chunks = self._open_stream(checklist_id)
+        
+        item_id = self._api_request('POST', f'{url}/items', {'content': 'Pushed'}, 201)['id']
+        self._api_request('POST', f'{url}/items/{item_id}/toggle')
+        self._api_request('DELETE', f'{url}/items/{item_id}')
+        
+        events = self._read_events(chunks, 3)
+        self.assertEqual([(event, data['op']) for _, event, data in events],
+                         [('item', 'upsert'), ('item', 'upsert'), ('item', 'delete')])
+        self.assertEqual(events[0][2]['id'], item_id)
+        self.assertEqual([change_id for change_id, _, _ in events], sorted(change_id for change_id, _, _ in events))
+        # The deleted item's earlier upserts are already gone from the table
+        self.assertNotIn('content', events[2][2])
+
+    def test_event_stream_resumes_from_last_event_id(self):
+        """Test that a reconnecting client first receives what it missed"""
+        self.app.config['SSE_HEARTBEAT'] = 0.05
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Resume'}, 201)['id']
+        url = f'/api/checklists/{checklist_id}'
+        first_id = self._api_request('POST', f'{url}/items', {'content': 'Seen'}, 201)['id']
+        since = self._read_events(self._open_stream(checklist_id, {'Last-Event-ID': '0'}), 2)[-1][0]
+        
+        self._api_request('POST', f'{url}/items', {'content': 'Missed'}, 201)
+        chunks = self._open_stream(checklist_id, {'Last-Event-ID': str(since)})
+        events = self._read_events(chunks, 1)
+        self.assertEqual(events[0][2]['content'], 'Missed')
+        self.assertNotEqual(events[0][2]['id'], first_id)
+        
+        for bad in ('x', str(10 ** 30)):
+            response = self.client.get(f'{url}/events', headers={'Last-Event-ID': bad})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.get_json()['error'], 'Invalid Last-Event-ID')
+
+    def test_slow_event_stream_is_reset(self):
+        """Test that a stream whose queue overflows is told to reconnect"""
+        self.app.config['SSE_HEARTBEAT'] = 0.05
+        hub = self.app.extensions['change_hub']
+        hub.queue_size = 2
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Slow'}, 201)['id']
+        chunks = self._open_stream(checklist_id)
+        
+        self._api_request('POST', f'/api/checklists/{checklist_id}/items:batch', {
+            'items': [{'content': str(n)} for n in range(10)]
+        }, 201)
+        deadline = time.monotonic() + 5
+        while not hub.stats()['dropped'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        
+        messages = [chunk.decode('utf-8') for chunk in chunks]  # Ends after the reset
+        self.assertIn('event: reset', messages[-1])
+        self.assertEqual(self._api_request('GET', '/api/stats')['change_hub']['dropped'], 1)
+
+    def test_event_streams_are_capped(self):
+        """Test that streams beyond the limit are refused instead of holding a thread"""
+        self.app.config['SSE_HEARTBEAT'] = 0.05
+        hub = self.app.extensions['change_hub']
+        hub.max_subscribers = 1
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Busy'}, 201)['id']
+        stream = self.client.get(f'/api/checklists/{checklist_id}/events', buffered=False)
+        self.assertEqual(stream.status_code, 200)
+        
+        response = self.client.get(f'/api/checklists/{checklist_id}/events')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '5')
+        self.assertEqual(hub.stats()['rejected'], 1)
+        
+        # Closing a stream frees its slot, even one that never sent a chunk
+        stream.close()
+        self.assertEqual(hub.stats()['subscribers'], 0)
+        chunks = self._open_stream(checklist_id)
+        self._api_request('POST', f'/api/checklists/{checklist_id}/items', {'content': 'Pushed'}, 201)
+        self.assertEqual(len(self._read_events(chunks, 1)), 1)
+
+    # ========================================
+    # GROUP COMMIT TESTS
+    # ========================================
+
+    def test_toggles_through_group_commit(self):
+        """Test that toggles routed through the write queue behave the same"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Queued'}, 201)['id']
+        item_id = self._api_request('POST', f'/api/checklists/{checklist_id}/items', {'content': 'A'}, 201)['id']
+        
+        app = create_app({'TESTING': True, 'DATABASE': self.db_path, 'SECRET_KEY': 'test',
+                          'WRITE_GROUP_COMMIT': True, 'WRITE_BATCH_DELAY': 0, 'STATS_USERS': ('testuser',)})
+        self.addCleanup(app.extensions['db_pool'].close_idle)
+        self.client = app.test_client()
+        self.client.post('/login', data={'username': 'testuser', 'password': 'testpass123'})
+        
+        response = self._api_request('POST', f'/api/checklists/{checklist_id}/items/{item_id}/toggle')
+        self.assertTrue(response['checked'])
+        self.assertEqual(self.client.post(f'/toggle_item/{item_id}').get_json(), {'success': True})
+        self.assertEqual(self.client.post('/toggle_item/9999').status_code, 404)
+        
+        item = self._api_request('GET', f'/api/checklists/{checklist_id}/items/{item_id}')
+        self.assertEqual(item['checked'], 0)
+        self.assertEqual(self._api_request('GET', '/api/stats')['write_queue']['operations'], 3)
+
+    def test_web_toggle_checks_ownership(self):
+        """Test that the web toggle route refuses other users' items"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Mine'}, 201)['id']
+        item_id = self._api_request('POST', f'/api/checklists/{checklist_id}/items', {'content': 'A'}, 201)['id']
+        
+        self.client.get('/logout')
+        self.client.post('/register', data={'username': 'user2', 'password': 'pass2'})
+        self.client.post('/login', data={'username': 'user2', 'password': 'pass2'})
+        self.assertEqual(self.client.post(f'/toggle_item/{item_id}').status_code, 404)
+    # ========================================
+    # IDEMPOTENCY TESTS
+    # ========================================
+
+    def _post_with_key(self, url, data, key):
+        """Helper posting JSON with an Idempotency-Key header"""
+        return self.client.post(url, data=json.dumps(data), content_type='application/json',
+                                headers={'Idempotency-Key': key})
+
+    def test_idempotent_retry_replays_response(self):
+        """Test that a retried create returns the first response without a duplicate"""
+        first = self._post_with_key('/api/checklists', {'title': 'Groceries'}, 'key-1')
+        retry = self._post_with_key('/api/checklists', {'title': 'Groceries'}, 'key-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.get_json(), first.get_json())
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+        self.assertNotIn('Idempotent-Replayed', first.headers)
+        
+        checklist_id = first.get_json()['id']
+        url = f'/api/checklists/{checklist_id}/items'
+        item = self._post_with_key(url, {'content': 'Milk'}, 'key-2').get_json()
+        self.assertEqual(self._post_with_key(url, {'content': 'Milk'}, 'key-2').get_json(), item)
+        self._post_with_key(url, {'content': 'Milk'}, 'key-3')
+        
+        self.assertEqual(len(self._api_request('GET', '/api/checklists')['checklists']), 1)
+        self.assertEqual(len(self._api_request('GET', url)['items']), 2)
+        self.assertEqual(self.app.extensions['idempotency_store'].stats()['replayed'], 2)
+
+    def test_idempotency_key_misuse(self):
+        """Test key reuse with another body, bad keys and per-user scoping"""
+        self._post_with_key('/api/checklists', {'title': 'First'}, 'shared')
+        response = self._post_with_key('/api/checklists', {'title': 'Second'}, 'shared')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self._post_with_key('/api/checklists', {'title': 'x'}, 'k' * 256).status_code, 400)
+        
+        self.client.get('/logout')
+        self.client.post('/register', data={'username': 'user2', 'password': 'pass2'})
+        self.client.post('/login', data={'username': 'user2', 'password': 'pass2'})
+        response = self._post_with_key('/api/checklists', {'title': 'Second'}, 'shared')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response.headers)
+
+    def test_idempotency_store_waits_for_in_flight_request(self):
+        """Test that a concurrent duplicate waits and then replays the response"""
+        store = IdempotencyStore(max_entries=10, ttl=60, max_bytes=1024)
+        self.assertIsNone(store.claim('k', timeout=1))
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(store.claim('k', timeout=5)))
+        waiter.start()
+        time.sleep(0.05)
+        self.assertEqual(results, [])
+        
+        stored = StoredResponse('fp', 201, b'{}', [])
+        store.release('k', stored)
+        waiter.join()
+        self.assertIs(results[0], stored)
+        self.assertEqual(store.stats()['in_flight'], 0)
+        
+        # An unrecorded outcome hands the key to the next request; a stuck owner times out
+        self.assertIsNone(store.claim('other', timeout=1))
+        with self.assertRaises(IdempotencyInProgress):
+            store.claim('other', timeout=0.01)
+        store.release('other')
+        self.assertIsNone(store.claim('other', timeout=1))
+    # ========================================
+    # OPTIMISTIC CONCURRENCY TESTS
+    # ========================================
+
+    def test_item_conditional_update(self):
+        """Test If-Match and body versions on item writes"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Versions'}, 201)['id']
+        created = self._api_request('POST', f'/api/checklists/{checklist_id}/items', {'content': 'A'}, 201)
+        self.assertEqual(created['version'], 1)
+        item_url = f'/api/checklists/{checklist_id}/items/{created["id"]}'
+        
+        etag = self.client.get(item_url).headers['ETag']
+        response = self.client.put(item_url, data=json.dumps({'content': 'B'}), content_type='application/json',
+                                   headers={'If-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['version'], 2)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        
+        # The old ETag is stale now: the write is refused and the current state returned
+        response = self.client.put(item_url, data=json.dumps({'content': 'C'}), content_type='application/json',
+                                   headers={'If-Match': etag})
+        self.assertEqual(response.status_code, 412)
+        current = response.get_json()['current']
+        self.assertEqual((current['content'], current['version']), ('B', 2))
+        
+        self._api_request('PUT', item_url, {'content': 'C', 'version': 1}, 412)
+        self._api_request('PUT', item_url, {'content': 'C', 'version': 'two'}, 400)
+        self.assertEqual(self._api_request('PUT', item_url, {'content': 'C', 'version': 2})['version'], 3)
+        self.assertEqual(self._api_request('PUT', item_url, {'content': 'D'})['version'], 4)
+        
+        toggled = self._api_request('POST', f'{item_url}/toggle', {'version': 4})
+        self.assertEqual((toggled['checked'], toggled['version']), (True, 5))
+        self._api_request('POST', f'{item_url}/toggle', {'version': 4}, 412)
+        response = self.client.delete(item_url, headers={'If-Match': '"item-999-v5"'})
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(self.client.delete(item_url, headers={'If-Match': '*'}).status_code, 200)
+        self._api_request('PUT', item_url, {'content': 'E', 'version': 5}, 404)
+
+    def test_checklist_conditional_update(self):
+        """Test that checklist writes check the version every change bumps"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Versions'}, 201)['id']
+        url = f'/api/checklists/{checklist_id}'
+        etag = self.client.get(url).headers['ETag']
+        self._api_request('POST', f'{url}/items', {'content': 'A'}, 201)
+        
+        # Adding an item changed the checklist, so the earlier ETag no longer matches
+        response = self.client.put(url, data=json.dumps({'title': 'Renamed'}), content_type='application/json',
+                                   headers={'If-Match': etag})
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(response.get_json()['current']['total_items'], 1)
+        
+        renamed = self.client.put(url, data=json.dumps({'title': 'Renamed'}), content_type='application/json',
+                                  headers={'If-Match': response.headers['ETag']})
+        self.assertEqual(renamed.status_code, 200)
+        version = renamed.get_json()['version']
+        self.assertEqual(renamed.headers['ETag'], f'"checklist-{checklist_id}-v{version}"')
+        
+        # A version SQLite cannot hold never matches; in the body it is malformed
+        huge = 10 ** 30
+        response = self.client.put(url, data=json.dumps({'title': 'Huge'}), content_type='application/json',
+                                   headers={'If-Match': f'"checklist-{checklist_id}-v{huge}"'})
+        self.assertEqual(response.status_code, 412)
+        self._api_request('PUT', url, {'title': 'Huge', 'version': huge}, 400)
+        self._api_request('POST', f'{url}/items:mutate', {'operations': [
+            {'op': 'toggle', 'id': 1, 'version': huge}
+        ]}, 400)
+        response = self.client.delete(url, headers={'If-Match': f'"checklist-{checklist_id}-v{version - 1}"'})
+        self.assertEqual(response.status_code, 412)
+        response = self.client.delete(url, headers={'If-Match': f'"checklist-{checklist_id}-v{version}"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_mutate_batch_checks_versions(self):
+        """Test that a stale version in a batch rolls the whole batch back"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Batch'}, 201)['id']
+        first = self._api_request('POST', f'/api/checklists/{checklist_id}/items', {'content': 'A'}, 201)['id']
+        second = self._api_request('POST', f'/api/checklists/{checklist_id}/items', {'content': 'B'}, 201)['id']
+        url = f'/api/checklists/{checklist_id}/items:mutate'
+        
+        response = self._api_request('POST', url, {'operations': [
+            {'op': 'toggle', 'id': first, 'version': 1},
+            {'op': 'update', 'id': first, 'content': 'A2', 'version': 2},
+        ]})
+        self.assertEqual([result['version'] for result in response['results']], [2, 3])
+        
+        response = self._api_request('POST', url, {'operations': [
+            {'op': 'toggle', 'id': second, 'version': 1},
+            {'op': 'set_checked', 'id': first, 'checked': False, 'version': 1},
+        ]}, 412)
+        self.assertEqual((response['index'], response['current']['version']), (1, 3))
+        item = self._api_request('GET', f'/api/checklists/{checklist_id}/items/{second}')
+        self.assertEqual((item['checked'], item['version']), (0, 1))
+    # ========================================
+    # BULK EXPORT AND IMPORT TESTS
+    # ========================================
+
+    def test_export_import_round_trip(self):
+        """Test that exported checklists import as copies with remapped ids"""
+        checklist_id = self._api_request('POST', '/api/checklists', {'title': 'Trip'}, 201)['id']
+        self._api_request('POST', f'/api/checklists/{checklist_id}/items:batch', {'items': [
+            {'content': 'Clothes', 'subitems': [{'content': 'Socks', 'checked': True}]},
+            {'content': 'Passport', 'url': 'example.com'},
+        ]}, 201)
+        original = self._api_request('GET', f'/api/checklists/{checklist_id}')
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        runner = self.app.test_cli_runner()
+        
+        paths = [os.path.join(temp_dir, f'export.{fmt}') for fmt in ('ndjson', 'json')]
+        for path in paths:
+            result = runner.invoke(args=['export', path, '--format', path.rsplit('.', 1)[1], '--user', 'testuser'])
+            self.assertEqual(result.exit_code, 0, result.output)
+            self.assertIn('1 checklist(s), 3 item(s)', result.output)
+        for path in paths:
+            result = runner.invoke(args=['import', path, '--user', 'testuser', '--chunk-size', '1'])
+            self.assertEqual(result.exit_code, 0, result.output)
+            self.assertIn('Imported 0 user(s), 1 checklist(s), 3 item(s)', result.output)
+        
+        checklists = self._api_request('GET', '/api/checklists')['checklists']
+        self.assertEqual([checklist['title'] for checklist in checklists], ['Trip'] * 3)
+        self.assertEqual([checklist['total_items'] for checklist in checklists], [3] * 3)
+        
+        def shape(items):
+            return [(item['content'], item['url'], item['checked'], shape(item['subitems'])) for item in items]
+        for copy in checklists[1:]:
+            imported = self._api_request('GET', f'/api/checklists/{copy["id"]}')
+            self.assertEqual(shape(imported['items']), shape(original['items']))
+            self.assertNotEqual(imported['items'][0]['id'], original['items'][0]['id'])
+
+    def test_import_rejects_malformed_input(self):
+        """Test that import reports bad input instead of writing it"""
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        path = os.path.join(temp_dir, 'bad.ndjson')
+        with open(path, 'w') as f:
+            f.write('{"type": "checklist", "id": 1, "user_id": 1, "title": "No header"}\n')
+        result = self.app.test_cli_runner().invoke(args=['import', path])
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn('export header', result.output)
+        self.assertEqual(self._api_request('GET', '/api/checklists')['checklists'], [])
 
 if __name__ == '__main__':
     # Run the tests
@@ -0,0 +1,318 @@
+import io
+import json
+import unittest
+import tempfile
+import os
+import sys
+import threading
+from unittest import mock
+sys.path.append('..')  # Add parent directory to path
+import app
+from app import (init_db, ensure_db_initialized, migrate_db, get_db_connection, get_schema_version, SCHEMA_VERSION,
+                 GroupCommitWriter, toggle_item_checked, update_owned_item, delete_owned_item,
+                 iter_export_records, write_export, read_export_records, iter_json_array, import_records)
+
+
+class DatabaseTestCase(unittest.TestCase):
+    """
+    Tests for database initialization and schema migrations
+
+    These tests work directly against a temporary SQLite file without
+    creating a Flask app, so they exercise init_db in standalone mode.
+    """
+
+    def setUp(self):
+        """Set up an empty temporary database file."""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+
+    def tearDown(self):
+        """Clean up after each test method."""
+        os.close(self.db_fd)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.db_path + suffix):
+                os.unlink(self.db_path + suffix)
+
+    def _index_names(self, db):
+        """Helper returning the names of all indexes in the database"""
+        rows = db.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall()
+        return {row['name'] for row in rows}
+
+    # ========================================
+    # MIGRATION TESTS
+    # ========================================
+
+    def test_fresh_database_is_fully_migrated(self):
+        """Test that init_db leaves a new database at the latest version"""
+        init_db(db_path=self.db_path)
+
+        db = get_db_connection(self.db_path)
+        try:
+            self.assertEqual(get_schema_version(db), SCHEMA_VERSION)
+            self.assertTrue({'idx_items_checklist', 'idx_items_parent', 'idx_checklists_user'}
+                            <= self._index_names(db))
+        finally:
+            db.close()
+
+    def test_legacy_database_migrates_in_place(self):
+        """Test that an unversioned database keeps its data when migrated"""
+        # Build a database the way the old DROP-and-recreate schema left it
+        db = get_db_connection(self.db_path)
+        db.executescript('''
+            CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE NOT NULL, password TEXT NOT NULL);
+            CREATE TABLE checklists (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, title TEXT NOT NULL);
+            CREATE TABLE items (id INTEGER PRIMARY KEY AUTOINCREMENT, checklist_id INTEGER NOT NULL,
+                                parent_item_id INTEGER, content TEXT NOT NULL, url TEXT,
+                                checked INTEGER NOT NULL DEFAULT 0);
+            INSERT INTO users (username, password) VALUES ('legacy', 'x');
+            INSERT INTO checklists (user_id, title) VALUES (1, 'Kept');
+            INSERT INTO items (checklist_id, content) VALUES (1, 'Still here');
+        ''')
+        db.close()
+
+        init_db(db_path=self.db_path)
+
+        db = get_db_connection(self.db_path)
+        try:
+            self.assertEqual(get_schema_version(db), SCHEMA_VERSION)
+            self.assertEqual(db.execute('SELECT title FROM checklists').fetchone()['title'], 'Kept')
+            self.assertEqual(db.execute('SELECT content FROM items').fetchone()['content'], 'Still here')
+            self.assertEqual(db.execute('SELECT total_items FROM checklists').fetchone()['total_items'], 1)
+        finally:
+            db.close()
+
+    def test_database_without_subitem_columns_migrates(self):
+        """Test that items tables from before subitems and links gain those columns"""
+        db = get_db_connection(self.db_path)
+        db.executescript('''
+            CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE NOT NULL, password TEXT NOT NULL);
+            CREATE TABLE checklists (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, title TEXT NOT NULL);
+            CREATE TABLE items (id INTEGER PRIMARY KEY AUTOINCREMENT, checklist_id INTEGER NOT NULL,
+                                content TEXT NOT NULL, checked INTEGER NOT NULL DEFAULT 0);
+            INSERT INTO users (username, password) VALUES ('legacy', 'x');
+            INSERT INTO checklists (user_id, title) VALUES (1, 'Kept');
+            INSERT INTO items (checklist_id, content, checked) VALUES (1, 'Flat', 1);
+        ''')
+        db.close()
+
+        init_db(db_path=self.db_path)
+
+        db = get_db_connection(self.db_path)
+        try:
+            self.assertEqual(get_schema_version(db), SCHEMA_VERSION)
+            item = db.execute('SELECT * FROM items').fetchone()
+            self.assertEqual((item['content'], item['parent_item_id'], item['url'], item['checked']),
+                             ('Flat', None, None, 1))
+            self.assertIn('idx_items_parent', self._index_names(db))
+            self.assertEqual(db.execute('SELECT checked_items FROM checklists').fetchone()[0], 1)
+        finally:
+            db.close()
+
+    def test_migrate_is_idempotent(self):
+        """Test that re-running migrations on a current database is a no-op"""
+        init_db(db_path=self.db_path)
+
+        db = get_db_connection(self.db_path)
+        try:
+            self.assertEqual(migrate_db(db), [])
+        finally:
+            db.close()
+
+    def test_item_lookups_use_indexes(self):
+        """Test that the hot item queries no longer scan the table"""
+        init_db(db_path=self.db_path)
+
+        db = get_db_connection(self.db_path)
+        try:
+            for query in ('SELECT * FROM items WHERE checklist_id = 1 ORDER BY id',
+                          'SELECT id FROM items WHERE parent_item_id = 1',
+                          'SELECT id, title FROM checklists WHERE user_id = 1 ORDER BY id'):
+                plan = ' '.join(row[3] for row in db.execute('EXPLAIN QUERY PLAN ' + query))
+                self.assertIn('USING', plan, query)
+                self.assertNotIn('SCAN items', plan, query)
+        finally:
+            db.close()
+
+    # ========================================
+    # STARTUP TESTS
+    # ========================================
+
+    def test_import_builds_no_app(self):
+        """Test that importing the module does not construct an app"""
+        self.assertFalse(hasattr(app, 'app'))
+
+    def test_schema_check_runs_once_per_database(self):
+        """Test that repeated startups reuse the first schema check"""
+        with mock.patch('app.database_exists_and_initialized',
+                        wraps=app.database_exists_and_initialized) as check:
+            ensure_db_initialized(db_path=self.db_path)
+            ensure_db_initialized(db_path=self.db_path)
+            ensure_db_initialized(db_path=self.db_path)
+        
+        self.assertEqual(check.call_count, 2)  # Once to detect, once inside init_db
+
+
+    # ========================================
+    # GROUP COMMIT TESTS
+    # ========================================
+
+    def test_group_commit_coalesces_concurrent_writes(self):
+        """Test that concurrent submits share transactions and all get results"""
+        init_db(db_path=self.db_path)
+        writer = GroupCommitWriter(self.db_path, max_batch=8, max_delay=0.05)
+        
+        def add_user(db, name):
+            return db.execute('INSERT INTO users (username, password) VALUES (?, ?)', (name, 'x')).lastrowid
+        
+        results = {}
+        def worker(n):
+            results[n] = writer.submit(add_user, f'user{n}')
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(sorted(results.values()), list(range(1, 21)))
+        stats = writer.stats()
+        self.assertEqual(stats['operations'], 20)
+        self.assertLess(stats['batches'], 20)
+        self.assertLessEqual(stats['largest_batch'], 8)
+
+    def test_group_commit_isolates_failures(self):
+        """Test that one failing operation does not undo the rest of its group"""
+        init_db(db_path=self.db_path)
+        writer = GroupCommitWriter(self.db_path, max_delay=0)
+        
+        def add_user(db, name):
+            db.execute('INSERT INTO users (username, password) VALUES (?, ?)', (name, 'x'))
+        
+        writer.submit(add_user, 'taken')
+        with self.assertRaises(Exception):
+            writer.submit(add_user, 'taken')  # UNIQUE constraint
+        writer.submit(add_user, 'fresh')
+        
+        db = get_db_connection(self.db_path)
+        try:
+            names = [row['username'] for row in db.execute('SELECT username FROM users ORDER BY id')]
+        finally:
+            db.close()
+        self.assertEqual(names, ['taken', 'fresh'])
+
+
+    # ========================================
+    # OWNERSHIP-SCOPED MUTATION TESTS
+    # ========================================
+
+    def _seed_items(self):
+        """Helper creating two users' checklists with a small tree for user 1"""
+        init_db(db_path=self.db_path)
+        db = get_db_connection(self.db_path)
+        db.executescript('''
+            INSERT INTO users (username, password) VALUES ('owner', 'x'), ('other', 'x');
+            INSERT INTO checklists (user_id, title) VALUES (1, 'Mine'), (2, 'Theirs');
+            INSERT INTO items (checklist_id, content) VALUES (1, 'Parent');
+            INSERT INTO items (checklist_id, parent_item_id, content) VALUES (1, 1, 'Child');
+            INSERT INTO items (checklist_id, content) VALUES (2, 'Foreign');
+        ''')
+        db.close()
+
+    def test_owned_mutations_respect_ownership(self):
+        """Test that mutations only touch the caller's items and report results"""
+        self._seed_items()
+        db = get_db_connection(self.db_path)
+        try:
+            self.assertIsNone(toggle_item_checked(db, 3, user_id=1))
+            self.assertIsNone(update_owned_item(db, 3, 1, {'content': 'Hacked'}))
+            self.assertIsNone(delete_owned_item(db, 3, 1))
+            self.assertIsNone(toggle_item_checked(db, 1, user_id=1, checklist_id=2))
+            
+            self.assertEqual(toggle_item_checked(db, 1, user_id=1), (1, 1, 2))
+            row = update_owned_item(db, 2, 1, {'content': 'Renamed', 'checked': 1}, checklist_id=1)
+            self.assertEqual((row['content'], row['checked'], row['parent_item_id']), ('Renamed', 1, 1))
+            self.assertEqual(delete_owned_item(db, 1, 1), (1, 2))
+            db.commit()
+            
+            self.assertEqual(db.execute('SELECT content FROM items').fetchall()[0]['content'], 'Foreign')
+            self.assertEqual(db.execute('SELECT version FROM checklists WHERE id = 1').fetchone()[0], 4)
+        finally:
+            db.close()
+
+    def test_concurrent_toggles_lose_no_updates(self):
+        """Test that toggles from many connections all take effect"""
+        self._seed_items()
+        
+        def worker():
+            db = get_db_connection(self.db_path)
+            try:
+                for _ in range(5):
+                    toggle_item_checked(db, 1, user_id=1)
+                    db.commit()
+            finally:
+                db.close()
+        threads = [threading.Thread(target=worker) for _ in range(7)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        db = get_db_connection(self.db_path)
+        try:
+            # 35 toggles in total leave the item checked
+            self.assertEqual(db.execute('SELECT checked FROM items WHERE id = 1').fetchone()[0], 1)
+            self.assertEqual(db.execute('SELECT version FROM checklists WHERE id = 1').fetchone()[0], 36)
+        finally:
+            db.close()
+
+    # ========================================
+    # BULK EXPORT AND IMPORT TESTS
+    # ========================================
+
+    def test_json_array_reader_across_chunks(self):
+        """Test that array elements split over read boundaries decode intact"""
+        text = ' [ {"a": "x, ]"} ,\n{"b": [1, 2, {"c": null}]}, 3 ] '
+        for chunk_size in (1, 2, 7, 1024):
+            self.assertEqual(list(iter_json_array(io.StringIO(text), chunk_size=chunk_size)),
+                             [{'a': 'x, ]'}, {'b': [1, 2, {'c': None}]}, 3])
+        self.assertEqual(list(iter_json_array(io.StringIO('[]'))), [])
+        with self.assertRaises(ValueError):
+            list(iter_json_array(io.StringIO('[{"a": 1}')))
+
+    def test_import_shifts_ids_past_existing_rows(self):
+        """Test that imported rows get fresh ids and keep their parent links"""
+        init_db(db_path=self.db_path)
+        db = get_db_connection(self.db_path)
+        try:
+            db.executescript('''
+                INSERT INTO users (username, password) VALUES ('owner', 'x');
+                INSERT INTO checklists (user_id, title) VALUES (1, 'Existing');
+                INSERT INTO items (checklist_id, content) VALUES (1, 'Existing item');
+            ''')
+            db.commit()
+            
+            out = io.BytesIO()
+            db.execute('BEGIN')
+            write_export(iter_export_records(db), out, 'ndjson', lambda record: json.dumps(record).encode())
+            db.rollback()
+            # Rename the exported user so the import creates a new account
+            text = out.getvalue().decode().replace('"owner"', '"copy"')
+            
+            progress = []
+            counts = import_records(db, read_export_records(io.StringIO(text)), chunk_size=1,
+                                    progress=lambda counts: progress.append(dict(counts)))
+            self.assertEqual(counts, {'users': 1, 'checklists': 1, 'items': 1})
+            self.assertEqual(len(progress), 1)
+            rows = db.execute(
+                'SELECT users.username, checklists.id, checklists.total_items, items.id AS item_id '
+                'FROM checklists JOIN users ON users.id = checklists.user_id '
+                'JOIN items ON items.checklist_id = checklists.id ORDER BY checklists.id'
+            ).fetchall()
+            self.assertEqual([tuple(row) for row in rows], [('owner', 1, 1, 1), ('copy', 2, 1, 2)])
+            
+            # The next regular insert lands after the reserved range
+            cursor = db.execute("INSERT INTO items (checklist_id, content) VALUES (1, 'Later')")
+            self.assertEqual(cursor.lastrowid, 3)
+        finally:
+            db.close()
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
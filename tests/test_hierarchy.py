@@ -0,0 +1,96 @@
+import unittest
+import sqlite3
+import sys
+sys.path.append('..')  # Add parent directory to path
+from app import build_item_tree, fetch_item_tree, organize_items_hierarchically, ITEM_COLUMNS
+
+
+class HierarchyTestCase(unittest.TestCase):
+    """
+    Tests for the single-pass item tree builder
+
+    Rows are plain tuples in items table column order, the same shape
+    the routes read from SQLite.
+    """
+
+    def _row(self, item_id, parent_id, content=None, checked=0):
+        """Helper building an item row tuple"""
+        return (item_id, 1, parent_id, content or f'Item {item_id}', '', checked, 1)
+
+    def test_builds_nested_tree(self):
+        """Test that children are nested under their parents in id order"""
+        rows = [self._row(1, None), self._row(2, 1), self._row(3, 1), self._row(4, 2), self._row(5, None)]
+        roots, orphans = build_item_tree(rows, ITEM_COLUMNS)
+        
+        self.assertEqual(orphans, [])
+        self.assertEqual([root['id'] for root in roots], [1, 5])
+        self.assertEqual([child['id'] for child in roots[0]['subitems']], [2, 3])
+        self.assertEqual(roots[0]['subitems'][0]['subitems'][0]['content'], 'Item 4')
+        self.assertEqual(roots[1]['subitems'], [])
+
+    def test_child_before_parent(self):
+        """Test that row order does not matter for attaching children"""
+        rows = [self._row(7, 9), self._row(9, None)]
+        roots, orphans = build_item_tree(rows, ITEM_COLUMNS)
+        
+        self.assertEqual(orphans, [])
+        self.assertEqual(roots[0]['subitems'][0]['id'], 7)
+
+    def test_orphans_reported(self):
+        """Test that subtrees with a missing parent are returned as orphans"""
+        rows = [self._row(1, None), self._row(2, 99), self._row(3, 2)]
+        roots, orphans = build_item_tree(rows, ITEM_COLUMNS)
+        
+        self.assertEqual([root['id'] for root in roots], [1])
+        self.assertEqual([orphan['id'] for orphan in orphans], [2])
+        self.assertEqual(orphans[0]['subitems'][0]['id'], 3)
+        
+    def test_organize_logs_orphans(self):
+        """Test that the route helper logs the subtrees it leaves out"""
+        db = sqlite3.connect(':memory:')
+        db.row_factory = sqlite3.Row
+        rows = db.execute(
+            "SELECT 1 AS id, 1 AS checklist_id, NULL AS parent_item_id, 'A' AS content, '' AS url, 0 AS checked "
+            "UNION ALL SELECT 2, 1, 99, 'B', '', 0"
+        ).fetchall()
+        db.close()
+        
+        with self.assertLogs('app', level='WARNING') as logs:
+            roots = organize_items_hierarchically(rows)
+        self.assertEqual([root['id'] for root in roots], [1])
+        self.assertIn('orphaned', logs.output[0])
+
+    def test_fetch_tree_logs_orphans(self):
+        """Test that trees loaded with fields or compact also log left-out subtrees"""
+        db = sqlite3.connect(':memory:')
+        db.row_factory = sqlite3.Row
+        db.execute(f"CREATE TABLE items ({', '.join(ITEM_COLUMNS)})")
+        db.executemany('INSERT INTO items VALUES (?, ?, ?, ?, ?, ?, ?)',
+                       [self._row(1, None), self._row(2, 99), self._row(3, 2)])
+        
+        for options in ({'fields': ('id', 'content')}, {'compact': True}):
+            with self.assertLogs('app', level='WARNING') as logs:
+                roots = fetch_item_tree(db, 1, **options)
+            self.assertEqual(len(roots), 1)
+            self.assertIn('orphaned item subtree(s): 2', logs.output[0])
+        db.close()
+
+    def test_compact_output(self):
+        """Test the compact [id, content, url, checked, subitems] nodes"""
+        rows = [self._row(1, None, 'Parent'), self._row(2, 1, 'Child', 1)]
+        roots, _ = build_item_tree(rows, ITEM_COLUMNS, compact=True)
+        
+        self.assertEqual(roots, [[1, 'Parent', '', 0, [[2, 'Child', '', 1, []]]]])
+
+    def test_custom_columns(self):
+        """Test the generic path for rows with a different column list"""
+        columns = ('parent_item_id', 'id', 'content')
+        roots, orphans = build_item_tree([(None, 1, 'A'), (1, 2, 'B')], columns)
+        
+        self.assertEqual(roots, [{'parent_item_id': None, 'id': 1, 'content': 'A', 'subitems': [
+            {'parent_item_id': 1, 'id': 2, 'content': 'B', 'subitems': []}
+        ]}])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)